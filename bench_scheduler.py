@@ -0,0 +1,71 @@
+#!/bin/env python3
+"""Rough benchmarks for scheduler, run with 'make bench'.  Each prints one
+line; compare the numbers before and after a change.
+"""
+import time
+import tracemalloc
+from draw import Point, Rectangle, RectBatch, Scene
+from draw_prim import Emitter
+from sched_util import Section, inches
+from scheduler import schedule_grid, add_sections
+
+def sample_sections():
+    """a week of back-to-back sections, like a busy lab room"""
+    out = list()
+    for day in "MTWRF":
+        for i, (start, end) in enumerate([((7,45), (9,40)), ((9,55), (11,50)),
+                                          ((12,5), (14,0)), ((14,25), (16,20)),
+                                          ((16,35), (18,30)), ((19,5), (21,0))]):
+            out.append(Section(day, start, str(301 + i), "Ojalvo", end))
+    return out
+
+def summary_scene(sections, rooms=9):
+    """a summary-sized scene: a 3x3 grid of small schedules"""
+    bb = Rectangle(Point(0,0), Point(inches(8.5), inches(11)))
+    s = Scene(bb)
+    w = inches(2.5) + inches(0.25)
+    for n in range(rooms):
+        i, j = n % 3, n // 3
+        cell = Rectangle(Point(i * w, bb.max_y - (j+1) * w),
+                         Point((i+1) * w, bb.max_y - j * w))
+        s = schedule_grid("Physics %d" % n, s, cell, 8)
+        s = add_sections(sections, s, cell, 8)
+    return s
+
+def bench_scene_memory(scenes=20):
+    sections = sample_sections()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [summary_scene(sections) for i in range(scenes)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print("scene memory: %d bytes per summary scene (%d objects)" %
+          ((after - before) / scenes, len(kept[0].objects)))
+
+def bench_scene_time(scenes=50):
+    sections = sample_sections()
+    t0 = time.perf_counter()
+    for i in range(scenes):
+        summary_scene(sections).to_ps_bytes()
+    t1 = time.perf_counter()
+    print("scene build+render: %.2f ms per summary scene" %
+          (1000 * (t1 - t0) / scenes))
+
+def bench_rect_batch(cells=20000):
+    rects = [Rectangle(Point(i % 100, i // 100), Point(i % 100 + 1, i // 100 + 1))
+             for i in range(cells)]
+    batch = RectBatch(rects)
+    t0 = time.perf_counter()
+    out = Emitter()
+    for r in rects:
+        r.translate((1, 1)).render(out)
+    t1 = time.perf_counter()
+    batch.translate((1, 1)).render(Emitter())
+    t2 = time.perf_counter()
+    print("%d cells: %.1f ms as Rectangles, %.1f ms as a RectBatch" %
+          (cells, 1000 * (t1 - t0), 1000 * (t2 - t1)))
+
+if __name__ == "__main__":
+    bench_scene_memory()
+    bench_scene_time()
+    bench_rect_batch()
@@ -1,9 +1,11 @@
+import io
 import math
 import sys
+from array import array
 from functools import reduce
-from draw_prim import render_preamble, render_footer, box, text, \
-                      svg_render_preamble, svg_render_footer, svg_box, svg_text, \
-                      svg_text_multi, svg_hline
+from draw_prim import Emitter, emit, num, render_doc_preamble, \
+                      render_page_begin, render_page_end, render_doc_footer, \
+                      PDFFile, PSBackend, PDFBackend, get_backend
 
 
 class Point:
@@ -11,6 +13,8 @@ class Point:
     of a Rectangle.  Some operators are defined on points:
     ('+', '-', '==', '<', '>')
     """
+    __slots__ = ("x", "y")
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -66,6 +70,7 @@ class Scene:
         self.objects = list()
         self.bounds = bounds
         self.canvas = None
+        self.layout = None # measurements of the canvas, see sched_util.GridLayout
 
     def add(self, obj, canvas=False):
         """add an object to the scene if it lies fully within the bounds"""
@@ -78,28 +83,163 @@ class Scene:
     def get_canvas(self):
         return self.canvas
     
-    def render(self, toFile=sys.stdout):
-        """create postscript output for all the objects in the scene by
-        calling each of their respective render methods
+    def draw(self, backend):
+        """draw all the objects in the scene with a draw_prim backend (just
+        the drawing, no document around it)
         """
-        render_preamble(self.bounds, toFile)
+        out = list()
         for obj in self.objects:
-            obj.render(toFile)
-        render_footer(toFile)
+            out.extend(obj.draw(backend))
+        return out
+
+    def document(self, toFile, backend="ps"):
+        """write the scene as a whole document to toFile in one go, backend
+        names the format (see draw_prim.get_backend).  The document is
+        returned too.
+        """
+        b = get_backend(backend)(toFile)
+        b.begin_document(self.bounds)
+        self.draw(b)
+        return b.end_document()
+
+    def to_bytes(self, backend="ps"):
+        """the document for this scene, built in memory"""
+        if get_backend(backend).binary:
+            return self.document(io.BytesIO(), backend)
+        return self.document(io.StringIO(), backend).encode("utf8")
+
+    def to_ps_bytes(self):
+        return self.to_bytes("ps")
+
+    def to_svg_bytes(self):
+        return self.to_bytes("svg")
+
+    def render(self, toFile=sys.stdout, backend="ps"):
+        """write output for all the objects in the scene, PostScript unless
+        backend says otherwise
+        """
+        self.document(toFile, backend)
 
     def render_svg(self, toFile=sys.stdout):
-        out = list()
-        out.extend(svg_render_preamble(self.bounds, toFile))
-        for obj in self.objects:
-            out.extend(obj.render_svg(toFile))
-        out.extend(svg_render_footer(toFile))
-        return "\n".join(out)
+        """write SVG output for all the objects in the scene, the document
+        is also returned as a string
+        """
+        return self.document(toFile, "svg")
 
     def __repr__(self):
         return "Scene(%s, %s)" % (self.bounds, self.canvas)
 
 
-class Rectangle:
+class PSDocument:
+    """A PostScript document with any number of pages, each holding one or
+    more Scenes.  Pages are written out as they're added, so only the page
+    at hand is ever in memory:
+
+    doc = PSDocument(outfile)
+    doc.page([(top, (0, 450)), (bottom, (0, 54))])   # (scene, (dx, dy))s
+    doc.page([(summary, (0, 0))])
+    doc.close()
+    """
+    def __init__(self, toFile=sys.stdout, width=612, height=792):
+        self.toFile = toFile
+        self.width = width
+        self.height = height
+        self.pages = 0
+        out = Emitter(toFile)
+        render_doc_preamble(width, height, out)
+        out.flush()
+
+    def page(self, placed):
+        """write a page with each scene moved by its (dx, dy)"""
+        body = PSBackend(Emitter(), font_dicts=True)
+        for scene, (dx, dy) in placed:
+            emit(["gsave %s %s translate" % (num(dx), num(dy))], body.out)
+            scene.draw(body)
+            emit(["grestore"], body.out)
+            body.font = None # grestore put the font back
+        self.pages += 1
+        out = Emitter(self.toFile)
+        render_page_begin(self.pages, body.fonts, out)
+        emit(body.out.lines, out)
+        render_page_end(out)
+        out.flush()
+
+    def close(self):
+        """finish the document (the file itself is left open)"""
+        out = Emitter(self.toFile)
+        render_doc_footer(self.pages, out)
+        out.flush()
+
+
+class PDFDocument:
+    """Like PSDocument, but writes PDF (toFile must be opened in binary
+    mode), see draw_prim.PDFFile for how it's put together.
+    """
+    def __init__(self, toFile, width=612, height=792):
+        self.pdf = PDFFile(toFile, (0, 0, width, height))
+        self.width = width
+        self.height = height
+        self.pages = 0
+
+    def page(self, placed):
+        """write a page with each scene moved by its (dx, dy)"""
+        body = PDFBackend(Emitter(), self.pdf)
+        for scene, (dx, dy) in placed:
+            emit(["q 1 0 0 1 %s %s cm" % (num(dx), num(dy))], body.out)
+            scene.draw(body)
+            emit(["Q"], body.out)
+            body.font, body.gray = None, 0.0 # Q put these back
+        self.pdf.page(body.out.getvalue(), body.fonts)
+        self.pages += 1
+
+    def close(self):
+        """finish the document (the file itself is left open)"""
+        self.pdf.close()
+
+
+class Drawable:
+    """What the things that go in a Scene have in common.  Each one has a
+    draw(backend) method that draws it with a draw_prim backend and returns
+    the lines emitted; these draw one on its own (not as a document).
+    """
+    __slots__ = ()
+
+    def render(self, toFile=sys.stdout, backend="ps"):
+        """draw to toFile, in PostScript unless backend says otherwise"""
+        return self.draw(get_backend(backend)(toFile))
+
+    def render_svg(self, toFile=sys.stdout):
+        return self.render(toFile, "svg")
+
+
+class Group(Drawable):
+    """A few objects that always get drawn together and look the same
+    wherever they are (e.g. an empty schedule grid).  key says which
+    drawing it is (two Groups with the same key differ only by where they
+    are), bounds is the area it's drawn in.  For PostScript and SVG this
+    just draws the objects; in a PDF each key is drawn once and reused.
+    """
+    def __init__(self, key, bounds):
+        self.key = key
+        self.bounds = bounds
+        self.origin = bounds.origin
+        self.objects = list()
+
+    def add(self, obj):
+        self.objects.append(obj)
+        return self
+
+    def contained_in(self, rect):
+        return all(obj.contained_in(rect) for obj in self.objects)
+
+    def draw(self, backend):
+        return backend.group(self)
+
+    def __repr__(self):
+        return "Group(%s, %d objects)" % (self.key, len(self.objects))
+
+
+class Rectangle(Drawable):
     """Defined by the lower-left corner (origin) and the upper-right corner
     (extent).  It is a ValueError for the lower-left corner to be farther
     from the point (0, 0) than the upper-right corner.
@@ -114,6 +254,11 @@ class Rectangle:
     The result is the combination of applying all those transformations.  I
     don't know how pythonic this is but I think it's cool.
     """
+    # there are a lot of these in a summary, so no per-instance __dict__
+    __slots__ = ("origin", "extent", "min_x", "max_x", "min_y", "max_y",
+                 "width", "height", "center_x", "center_y",
+                 "fill_color", "filled", "label")
+
     def __init__(self, origin, extent):
         self.__resize(origin, extent)
         self.fill_color = 1.0
@@ -170,34 +315,17 @@ class Rectangle:
         self.label = Text(p, txt, size=fontsize, font="Helvetica", hCenter=True)
         return self
 
-    def label_above_svg(self, txt, fontsize=12, vbump=0):
-        """Create a centered label above the rectangle"""
-        p = Point(self.center_x, self.min_y - fontsize/2 - vbump)
-        self.label = Text(p, txt, size=fontsize, font="Helvetica", hCenter=True)
-        return self
-
     def label_above_left(self, txt, fontsize=12.0, hbump=0):
         """create a label above and to the left of the rectangle"""
         p = Point(self.origin.x + hbump, self.max_y + fontsize/2)
         self.label = Text(p, txt, size=fontsize, font="Helvetica", hCenter=False)
         return self
 
-    def label_above_left_svg(self, txt, fontsize=12, hbump=0, vbump=0):
-        """create a label above and to the left of the rectangle"""
-        p = Point(self.origin.x + hbump, self.min_y - fontsize/2 + vbump)
-        self.label = Text(p, txt, size=fontsize, font="Helvetica", hCenter=False)
-        return self
-
     def label_below_left(self, txt, fontsize=12.0, hbump=0, vbump=0):
         p = Point(self.origin.x + hbump, self.min_y - fontsize/2 + vbump)
         self.label = Text(p, txt, size=fontsize, font="Helvetica", hCenter=False)
         return self
 
-    def label_below_left_svg(self, txt, fontsize=12, hbump=0, vbump=0):
-        p = Point(self.origin.x + hbump, self.max_y + fontsize/2 + vbump)
-        self.label = Text(p, txt, size=fontsize, font="Helvetica", hCenter=False)
-        return self
-
     def label_inside(self, txt, fontsize=10):
         """center the label both horizontally and vertically inside the
         rectangle. txt can be a list of strings, these will be formatted
@@ -207,14 +335,6 @@ class Rectangle:
         self.label = Text(p, txt, size=fontsize, font="Helvetica", hCenter=True)
         return self
 
-    def label_inside_multi_svg(self, txt, fontsize=10, hbump=0, vbump=0):
-        """label inside the rectangle starting in the upper left, suitable
-        for labeling section information
-        """
-        p = Point(self.min_x + hbump, self.max_y + fontsize + vbump)
-        self.label = Text(p, txt, size=fontsize, font="Helvetica", hCenter=False)
-        return self
-
     def label_inside_multi(self, txt, fontsize=10, hbump=0, vbump=0):
         """label inside the rectangle starting in the upper left, suitable
         for labeling section information
@@ -223,21 +343,12 @@ class Rectangle:
         self.label = Text(p, txt, size=fontsize, font="Helvetica", hCenter=False)
         return self
 
-    def render(self, toFile=sys.stdout):
-        """call to the low-level drawing primitives"""
-        b = box(self.origin, self.extent, self.filled, self.fill_color,
-                toFile)
-        lab = list()
-        if self.label:
-            lab = self.label.render(toFile)
-        return b + lab
-
-    def render_svg(self, toFile=sys.stdout):
-        b = svg_box(self.origin, self.extent, self.filled, self.fill_color,
-                    toFile)
+    def draw(self, backend):
+        b = backend.rect(self.min_x, self.min_y, self.max_x, self.max_y,
+                         self.filled, self.fill_color)
         lab = list()
         if self.label:
-            lab = self.label.render_svg(toFile)
+            lab = self.label.draw(backend)
         return b + lab
 
     def shrink(self, x):
@@ -265,13 +376,6 @@ class Rectangle:
         self.__resize(o, e)
         return self
 
-    def lower_svg(self, i):
-        """decrease the height by i (from the top)"""
-        e = self.extent
-        o = Point(self.origin.x, self.origin.y + i)
-        self.__resize(o, e)
-        return self
-
     def __repr__(self):
         return "Rectangle(%s, %s)" % (self.origin, self.extent)
 
@@ -279,6 +383,8 @@ class Rectangle:
 class HLine(Rectangle):
     """HLine is just a rectangle constrained to have zero vertical height
     """
+    __slots__ = ()
+
     def __init__(self, origin, width):
         self.width = width
         self.origin = origin
@@ -288,16 +394,124 @@ class HLine(Rectangle):
     def __repr__(self):
         return "Horizontal(%s, width:%d)" % (self.origin, self.width)
 
-    def render_svg(self, toFile=sys.stdout):
+    def draw(self, backend):
+        l = backend.line(self.min_x, self.min_y, self.max_x, self.max_y)
         if self.label:
-            l = self.label.render_svg(toFile)
-        return l + svg_hline(self.origin, self.width, toFile)
+            l = l + self.label.draw(backend)
+        return l
+
+
+class RectBatch(Drawable):
+    """A lot of rectangles stored column-wise (one array per coordinate)
+    instead of as individual Rectangle and Point objects.  This is meant for
+    scenes with many thousands of cells (e.g. a campus-wide poster), where
+    the per-object overhead adds up.  A RectBatch can be added to a Scene
+    like any other object (but shouldn't be used as its canvas):
+
+    cells = RectBatch(timeslot(s, scene).fill(1.0) for s in sections)
+    scene.add(cells.translate((0, -10)))
+
+    Like Rectangle, the modifying operations work in place and return the
+    batch for chaining.
+    """
+    def __init__(self, rects=()):
+        self.min_x = array('d')
+        self.min_y = array('d')
+        self.max_x = array('d')
+        self.max_y = array('d')
+        self.fill_color = array('d')
+        self.filled = array('b')
+        self.labels = list()
+        self.extend(rects)
+
+    def append(self, rect):
+        """add a copy of a Rectangle (its label is shared, not copied)"""
+        self.min_x.append(rect.min_x)
+        self.min_y.append(rect.min_y)
+        self.max_x.append(rect.max_x)
+        self.max_y.append(rect.max_y)
+        self.fill_color.append(rect.fill_color)
+        self.filled.append(rect.filled)
+        self.labels.append(rect.label)
+        return self
+
+    def extend(self, rects):
+        for r in rects:
+            self.append(r)
+        return self
 
+    def __len__(self):
+        return len(self.min_x)
 
-class Text:
+    def __getitem__(self, i):
+        """the i'th cell as a new Rectangle"""
+        r = Rectangle(Point(self.min_x[i], self.min_y[i]),
+                      Point(self.max_x[i], self.max_y[i]))
+        r.label = self.labels[i]
+        if self.filled[i]:
+            r.fill(self.fill_color[i])
+        return r
+
+    def translate(self, mov):
+        """Move every cell by MOV (an x-y tuple)"""
+        a, b = mov
+        self.min_x = array('d', [x + a for x in self.min_x])
+        self.max_x = array('d', [x + a for x in self.max_x])
+        self.min_y = array('d', [y + b for y in self.min_y])
+        self.max_y = array('d', [y + b for y in self.max_y])
+        return self
+
+    def shrink(self, x):
+        """make every cell smaller by x at each margin"""
+        min_x = array('d', [v + x for v in self.min_x])
+        max_x = array('d', [v - x for v in self.max_x])
+        min_y = array('d', [v + x for v in self.min_y])
+        max_y = array('d', [v - x for v in self.max_y])
+        if any(map(lambda lo, hi: lo > hi, min_x, max_x)) or \
+           any(map(lambda lo, hi: lo > hi, min_y, max_y)):
+            raise ValueError("Shrinking by %s turns a cell inside out" % x)
+        self.min_x, self.max_x, self.min_y, self.max_y = min_x, max_x, min_y, max_y
+        return self
+
+    def fill(self, color=0.0):
+        """fill every cell with color (fraction of gray, 1.0 == white)"""
+        n = len(self)
+        self.filled = array('b', [1] * n)
+        self.fill_color = array('d', [color] * n)
+        return self
+
+    def contained_in(self, rect):
+        """determine if every cell lies completely inside (or on top) of
+        the Rectangle rect
+        """
+        if not len(self):
+            return True
+        return rect.min_x <= min(self.min_x) and max(self.max_x) <= rect.max_x \
+           and rect.min_y <= min(self.min_y) and max(self.max_y) <= rect.max_y
+
+    def draw(self, backend):
+        """draw every cell (and its label) without making any Rectangle
+        objects
+        """
+        out = list()
+        rect = backend.rect
+        for i in range(len(self)):
+            out.extend(rect(self.min_x[i], self.min_y[i], self.max_x[i],
+                            self.max_y[i], self.filled[i], self.fill_color[i]))
+            if self.labels[i]:
+                out.extend(self.labels[i].draw(backend))
+        return out
+
+    def __repr__(self):
+        return "RectBatch(%d cells)" % len(self)
+
+
+class Text(Drawable):
     """A Text object.  Often this is part of a Rectangle instance as its
     label.  This can be multiline if txt is a list of strings
     """
+    __slots__ = ("pos", "txt", "hCenter", "font", "size", "height", "width")
+
     def __init__(self, pos, txt, hCenter=True, font="Helvetica", size=12):
         self.pos = pos
         self.txt = txt
@@ -311,30 +525,12 @@ class Text:
         """You're on your own"""
         return True
 
-    def render(self, toFile=sys.stdout):
-        """call to the low-level drawing primitives"""
-        # render multiline text
-        retval = list()
-        if type(self.txt) == type(list()):
-            offset = self.size
-            retval.extend(text(Point(self.pos.x, self.pos.y - offset), self.txt[0],
-                               self.font, self.size, self.hCenter, toFile))
-            for line in self.txt[1:]:
-                offset = offset + (self.size - 2)
-                retval.extend(text(Point(self.pos.x, self.pos.y - offset), line, self.font,
-                                   self.size - 2, self.hCenter, toFile))
-            return retval
-
-        # single line of text
-        return text(self.pos, self.txt, self.font, self.size, self.hCenter, toFile)
-
-    def render_svg(self, toFile=sys.stdout):
-        retval = list()
+    def draw(self, backend):
         if type(self.txt) == type(list()):
-            return svg_text_multi(self.pos, self.txt, self.font, self.size,
-                                  self.hCenter, toFile)
-        return svg_text(self.pos, self.txt, self.font, self.size, 
-                        self.hCenter, toFile)
+            return backend.text_block(self.pos.x, self.pos.y, self.txt,
+                                      self.font, self.size, self.hCenter)
+        return backend.text(self.pos.x, self.pos.y, self.txt, self.font,
+                            self.size, self.hCenter)
 
     def __repr__(self):
         return "Text(%s)" % self.txt
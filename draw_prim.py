@@ -1,66 +1,262 @@
+import io
+import struct
 import sys
+import zlib
+
+class Emitter:
+    """Collects the lines of a document so that it can be written out with a
+    single write.  The backends below accept one of these wherever they
+    take an output file:
+
+    out = Emitter(outfile)
+    ps = PSBackend(out)
+    ps.rect(0, 0, 10, 10)
+    ps.text(5, 12, "hi")
+    out.flush()   # one write, one join
+
+    A whole document (see Backend.end_document) is written to it like to a
+    file.  The exception is PDF, which is bytes and needs a file opened in
+    binary mode.
+    """
+    def __init__(self, toFile=None):
+        self.toFile = toFile
+        self.lines = list()
+
+    def emit(self, lines):
+        """queue up some lines of output"""
+        self.lines.extend(lines)
+
+    def write(self, txt):
+        """queue up text (whole lines) as if this were a file"""
+        self.lines.extend(txt.splitlines())
+
+    def getvalue(self):
+        """everything queued so far, as one string"""
+        if not self.lines:
+            return ""
+        return "\n".join(self.lines) + "\n"
+
+    def flush(self):
+        """write everything queued so far to toFile (if any)"""
+        if self.toFile is not None and self.lines:
+            self.toFile.write(self.getvalue())
+        self.lines = list()
+
+def emit(lines, toFile=sys.stdout):
+    """send lines to an Emitter, or straight to a file"""
+    if isinstance(toFile, Emitter):
+        toFile.emit(lines)
+    else:
+        print("\n".join(lines), file=toFile)
+    return lines
+
 #
 # Drawing primitives (here be PostScript-specific dragons)
 #
-def render_preamble(rect, toFile=sys.stdout):
-    """Emit the required boilerplate for a postscript document"""
-    page_height = rect.max_y - rect.min_y
-    print("""%%!PS-Adobe-2.0
-%%%%BoundingBox: 0 0 612 %d
+# The prolog defines a few procedures so that each box or label is a line
+# or two.  Fills are done inside a gsave in F, so outside of that the gray
+# is always black and never needs setting.
+#
+#   x y w h P        path around a box (nothing drawn)
+#   x y w h B        outline a box
+#   x y w h g F      fill a box with gray g, then outline it
+#   x y (txt) C      show txt centered on x
+#   x y (txt) L      show txt starting at x
+#   /font size SF    find, scale and set a font
+#
+prolog = """/P { 4 2 roll moveto 1 index 0 rlineto 0 exch rlineto neg 0 rlineto closepath } bind def
+/B { P stroke } bind def
+/F { gsave setgray 4 copy P fill grestore P stroke } bind def
+/C { 3 1 roll moveto dup stringwidth pop 2 div neg 0 rmoveto show } bind def
+/L { 3 1 roll moveto show } bind def
+/SF { exch findfont exch scalefont setfont } bind def"""
+
+def num(x):
+    """a number for PostScript, with no more digits than it needs"""
+    s = ("%.2f" % x).rstrip("0").rstrip(".")
+    if s == "-0":
+        return "0"
+    return s
+
+def header_lines(width, height, pages, version="2.0"):
+    """the DSC header, prolog and (the start of the) setup for a document
+    of pages (a number, or "(atend)") pages, each width x height
+    """
+    return ("""%%!PS-Adobe-%s
+%%%%BoundingBox: 0 0 %d %d
 %%%%Creator: scheduler <cwilson@physics.wisc.edu>
 %%%%Title: lab schedule
-%%%%Pages: 1
+%%%%Pages: %s
 %%%%PageOrder: Ascend
 %%%%DocumentData: Clean7Bit
 %%%%EndComments
 %%%%BeginProlog
+%s
 %%%%EndProlog
 %%%%BeginSetup
-<< /PageSize [612 %d] >> setpagedevice
-%%%%EndSetup
-%%%%Page: 1 1""" % (page_height, page_height), file=toFile)
-    return
+<< /PageSize [%d %d] >> setpagedevice""" % (version, width, height, pages,
+                                             prolog, width, height)).split("\n")
+
+def render_preamble(rect, toFile=sys.stdout, fonts=None):
+    """Emit the required boilerplate for a postscript document.  fonts is
+    {(font, size): name} (see PSBackend.font_name), a font dictionary called
+    name is set up for each.
+    """
+    page_height = rect.max_y - rect.min_y
+    lines = header_lines(612, page_height, 1)
+    lines.extend(font_lines(fonts))
+    lines.append("%%EndSetup")
+    lines.append("%%Page: 1 1")
+    return emit(lines, toFile)
+
+def font_lines(fonts):
+    """the definitions of the font dictionaries {(font, size): name}"""
+    lines = list()
+    for (font, size), name in sorted((fonts or {}).items(),
+                                     key=lambda f: f[1]):
+        lines.append("/%s /%s findfont %s scalefont def" % (name, font, num(size)))
+    return lines
 
 def render_footer(toFile=sys.stdout):
     """Emit the required trailing boilerplate for a postscript document"""
-    print("showpage", file=toFile)
-    print("%%Trailer", file=toFile)
-    print("%%EOF", file=toFile)
-
-def box(p1, p2, fill=False, color=1.0, toFile=sys.stdout):
-    """Draw a basic rectangle with corners at p1 and p2.  Pretty much a
-    low-level mapping of the Rectangle object"""
-    w = p2.x - p1.x
-    h = p2.y - p1.y
-    lines = list()
-    lines.append("%% BOX at %s %f by %f" % (p1, w, h))
-    lines.append("%f %f moveto" % (p1.x, p1.y))
-    lines.append("%f 0 rlineto" % w)
-    lines.append("0 %f rlineto" % h)
-    lines.append("%f 0 rlineto" % (-1.0*w))
-    lines.append("0 %f rlineto" % (-1.0*h))
+    return emit(["showpage", "%%Trailer", "%%EOF"], toFile)
+
+#
+# Multi-page documents: a preamble, any number of pages (each one saves and
+# restores the state around it, and sets up its own fonts, so pages don't
+# depend on each other) and a footer with the page count.
+#
+def render_doc_preamble(width=612, height=792, toFile=sys.stdout):
+    lines = header_lines(width, height, "(atend)", "3.0")
+    lines.append("%%EndSetup")
+    return emit(lines, toFile)
+
+def render_page_begin(number, fonts=None, toFile=sys.stdout):
+    lines = ["%%%%Page: %d %d" % (number, number), "%%BeginPageSetup",
+             "/pagesave save def"]
+    lines.extend(font_lines(fonts))
+    lines.append("%%EndPageSetup")
+    return emit(lines, toFile)
+
+def render_page_end(toFile=sys.stdout):
+    return emit(["pagesave restore", "showpage"], toFile)
+
+def render_doc_footer(pages, toFile=sys.stdout):
+    return emit(["%%Trailer", "%%%%Pages: %d" % pages, "%%EOF"], toFile)
+
+def box_lines(x1, y1, x2, y2, fill=False, color=1.0):
+    """The postscript for a box with corners (x1, y1) and (x2, y2), as a
+    list of lines (nothing is emitted)"""
     if fill:
-        lines.append("gsave closepath")
-        lines.append("%0.2f setgray" % color)
-        lines.append("fill")
-        lines.append("0 setgray grestore")
-    lines.append("closepath stroke")
-    print("\n".join(lines), file=toFile)
-    return lines
+        return ["%s %s %s %s %s F" % (num(x1), num(y1), num(x2 - x1),
+                                      num(y2 - y1), num(color))]
+    return ["%s %s %s %s B" % (num(x1), num(y1), num(x2 - x1), num(y2 - y1))]
 
-def text(pt, txt, font="Helvetica", size=12, center=True, toFile=sys.stdout):
-    """Draw a line of PostScript text. Normally, code to center the line
-    horizontally is emitted."""
-    lines = list()
-    lines.append("%% LABEL at %s (%s)" % (pt, txt))
-    lines.append("%f %f moveto" % (pt.x, pt.y))
-    lines.append("/%s findfont %f scalefont setfont" % (font, size))
-    if center:
-        lines.append("(%s) dup stringwidth pop 2 div neg 0 rmoveto show" % txt)
-    else:
-        lines.append("(%s) show" % txt)
-    print("\n".join(lines), file=toFile)
-    return lines
+#
+# drawing primitives PDF
+#
+# Only the standard Helvetica is used, whose character widths (in 1/1000
+# of the size) are needed to center text ourselves, from ' ' to '~':
+helvetica_widths = [
+    278, 278, 355, 556, 556, 889, 667, 222, 333, 333, 389, 584, 278, 333,
+    278, 278, 556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278,
+    584, 584, 584, 556, 1015, 667, 667, 722, 722, 667, 611, 778, 722, 278,
+    500, 667, 556, 833, 722, 778, 667, 778, 722, 667, 611, 722, 667, 944,
+    667, 667, 611, 278, 278, 278, 469, 556, 222, 556, 556, 500, 556, 556,
+    278, 556, 556, 222, 222, 500, 222, 833, 556, 556, 556, 556, 333, 500,
+    278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584]
+
+def text_width(txt, size=12):
+    """width of txt in Helvetica at size (points)"""
+    w = 0
+    for c in txt:
+        n = ord(c) - 32
+        w += helvetica_widths[n] if 0 <= n < len(helvetica_widths) else 556
+    return w * size / 1000.0
+
+def pdf_string(txt):
+    """txt as a PDF string literal, in WinAnsiEncoding (the fonts' encoding,
+    see PDFFile.close) so each character is one byte, written as latin-1
+    """
+    txt = txt.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    return "(%s)" % txt.encode("cp1252", "replace").decode("latin-1")
+
+class PDFWriter:
+    """The bare bones of a PDF file: objects are numbered as they're added.
+    Dictionaries (add) are kept and written at the end, together in one
+    compressed object stream; streams (stream) are compressed and written
+    right away.  The cross-reference table is a (compressed) stream too,
+    so this is PDF 1.5.
+
+    pdf = PDFWriter(outfile)   # a binary file
+    page = pdf.add("<< /Type /Page ... >>")
+    ...
+    pdf.close(catalog)
+    """
+    def __init__(self, toFile):
+        self.toFile = toFile
+        self.pos = 0
+        self.offsets = dict() # {num: byte offset} of objects in the file
+        self.packed = list()  # [(num, text)] for the object stream
+        self.count = 0
+        self.write(b"%PDF-1.5\n%\xe2\xe3\xcf\xd3\n")
+
+    def write(self, data):
+        self.toFile.write(data)
+        self.pos += len(data)
+
+    def reserve(self):
+        """a number for an object that will be added later"""
+        self.count += 1
+        return self.count
+
+    def add(self, obj, num=None):
+        """add a (non-stream) object, given as text, return its number"""
+        if num is None:
+            num = self.reserve()
+        self.packed.append((num, obj))
+        return num
+
+    def stream(self, entries, data, num=None):
+        """write a stream object now (data is bytes, entries the rest of
+        its dictionary as text), return its number
+        """
+        if num is None:
+            num = self.reserve()
+        data = zlib.compress(data)
+        self.offsets[num] = self.pos
+        self.write(("%d 0 obj\n<< %s /Length %d /Filter /FlateDecode >>\n"
+                    "stream\n" % (num, entries, len(data))).encode("latin-1"))
+        self.write(data)
+        self.write(b"\nendstream\nendobj\n")
+        return num
+
+    def close(self, root):
+        """write the object stream and cross-reference, root is the number
+        of the document catalog
+        """
+        objstm = self.reserve()
+        index, body = list(), list()
+        at = 0
+        for num, obj in self.packed:
+            data = obj.encode("latin-1") + b"\n"
+            index.append("%d %d" % (num, at))
+            body.append(data)
+            at += len(data)
+        index = (" ".join(index) + "\n").encode("latin-1")
+        self.stream("/Type /ObjStm /N %d /First %d" % (len(self.packed), len(index)),
+                    index + b"".join(body), objstm)
+        xref = self.reserve()
+        entries = [struct.pack(">BIH", 0, 0, 65535)] + [None] * self.count
+        for n, (num, obj) in enumerate(self.packed):
+            entries[num] = struct.pack(">BIH", 2, objstm, n)
+        self.offsets[xref] = self.pos
+        for num, offset in self.offsets.items():
+            entries[num] = struct.pack(">BIH", 1, offset, 0)
+        start = self.pos
+        self.stream("/Type /XRef /Size %d /W [1 4 2] /Root %d 0 R" %
+                    (self.count + 1, root), b"".join(entries), xref)
+        self.write(("startxref\n%d\n%%%%EOF\n" % start).encode("latin-1"))
 
 #
 # drawing primitives SVG
@@ -70,61 +266,380 @@ def svg_render_preamble(rect, toFile=sys.stdout):
     lines.append('<svg xmlns="http://www.w3.org/2000/svg" ' +
                  'width="%dpx" height="%dpx" ' % (rect.width, rect.height) +
                  'xmlns:xlink="http://www.w3.org/1999/xlink">')
-    print("\n".join(lines), file=toFile)
-    return lines
+    return emit(lines, toFile)
 
 def svg_render_footer(toFile=sys.stdout):
     lines = list()
     lines.append('</svg>')
-    print("\n".join(lines), file=toFile)
-    return lines
+    return emit(lines, toFile)
 
-def svg_box(p1, p2, fill=False, color=1.0, toFile=sys.stdout):
-    lines = list()
+def svg_box_line(x1, y1, x2, y2, fill=False, color=1.0):
+    """The <rect> element for a box (nothing is emitted)"""
     toHex = lambda x: "#" + ("%02x" % int(x * 255)) * 3
-    width = p2.x - p1.x
-    height = p2.y - p1.y
-    l1 = '<rect x="%f" y="%f" height="%f" width="%f" style="stroke: %s; fill: %s;"/>' % \
-        (p1.x, p1.y, height, width, toHex(0), toHex(color))
-    lines.append(l1)
-    print("\n".join(lines), file=toFile)
-    return lines
+    width = x2 - x1
+    height = y2 - y1
+    return '<rect x="%f" y="%f" height="%f" width="%f" style="stroke: %s; fill: %s;"/>' % \
+        (x1, y1, height, width, toHex(0), toHex(color) if fill else "none")
 
-def svg_text(pt, txt, font="Helvetica", size=12, center=True, toFile=sys.stdout):
-    """Draw a line of SVG text. Normally code to center the line
-    horizontally is emitted."""
+def svg_text_line(x, y, txt, font="Helvetica", size=12, center=True):
+    """The <text> element for one line of SVG text (nothing is emitted)"""
     if center:
         anchorpos = "middle"
     else:
         anchorpos = "start"
-    style = "font-family: '%s'; font-size: %dpt;" % (font, size)
-    lines = list()
-    lines.append('<text x="%f" y="%f" style="%s" text-anchor="%s">%s</text>' % \
-                     (pt.x, pt.y, style, anchorpos, txt))
-    print("\n".join(lines), file=toFile)
-    return lines
+    # sizes are in user units (px), the same as the coordinates
+    style = "font-family: '%s'; font-size: %spx;" % (font, num(size))
+    return '<text x="%f" y="%f" style="%s" text-anchor="%s">%s</text>' % \
+        (x, y, style, anchorpos, txt)
 
-def svg_text_multi(pt, txt, font="Helvetica", size=12, center=True,
-                   toFile=sys.stdout):
-    lines = list()
-    if center:
-        anchorpos = "middle"
-    else:
-        anchorpos = "start"
+def svg_line(x1, y1, x2, y2):
+    """The <line> element for a line (nothing is emitted)"""
+    return '<line x1="%f" y1="%f" x2="%f" y2="%f" style="stroke:#000000;"/>' % \
+        (x1, y1, x2, y2)
 
-    # heading
-    lines.extend(svg_text(pt, txt[0], "Helvetica", size+2, False, toFile))
-    offset = 0
-    for line in txt[1:]:
-        offset = offset + size
-        lines.extend(svg_text(pt.translate((0,offset)), line, "Helvetica",
-                              size, False, toFile))
-    print("\n".join(lines), file=toFile)
-    return lines
+class PDFFile:
+    """A PDF document on its way out.  All the pages share one resource
+    dictionary, so there's one font object however many pages use it, and
+    each Group (e.g. an empty schedule grid) is drawn once, as a form, and
+    reused wherever the same one appears.  Page contents are compressed
+    and written as they're added; the small page dictionaries wait for
+    close().  media is the page size (x1, y1, x2, y2).
+    """
+    def __init__(self, toFile, media=(0, 0, 612, 792)):
+        self.writer = PDFWriter(toFile)
+        self.media = media
+        self.catalog = self.writer.reserve()
+        self.pages_num = self.writer.reserve()
+        self.resources = self.writer.reserve()
+        self.kids = list()
+        self.fonts = set()
+        self.forms = dict() # {group key: (name, number, origin)}
 
-def svg_hline(pt, length, toFile=sys.stdout):
-    lines = list()
-    lines.append('<line x1="%f" y1="%f" x2="%f" y2="%f" style="stroke:#000000;"/>' %\
-                     (pt.x, pt.y, pt.x+length, pt.y))
-    print("\n".join(lines), file=toFile)
-    return lines
+    def page(self, content, fonts=()):
+        """add a page, content is its drawing (text), fonts the fonts used"""
+        self.fonts.update(fonts)
+        contents = self.writer.stream("", content.encode("latin-1"))
+        self.kids.append(self.writer.add(
+            "<< /Type /Page /Parent %d 0 R /MediaBox [%s] "
+            "/Resources %d 0 R /Contents %d 0 R >>" %
+            (self.pages_num, " ".join(num(m) for m in self.media),
+             self.resources, contents)))
+
+    def form(self, group):
+        """(name, origin) of the form for a Group, writing it the first
+        time; it's drawn where group was, so elsewhere it's moved by the
+        difference in origin
+        """
+        if group.key not in self.forms:
+            backend = PDFBackend(Emitter(), self)
+            backend.gray = None # whatever the page has
+            for obj in group.objects:
+                obj.draw(backend)
+            self.fonts.update(backend.fonts)
+            b = group.bounds
+            n = self.writer.stream("/Type /XObject /Subtype /Form "
+                                   "/BBox [%s %s %s %s] /Resources %d 0 R" %
+                                   (num(b.min_x), num(b.min_y), num(b.max_x),
+                                    num(b.max_y), self.resources),
+                                   backend.out.getvalue().encode("latin-1"))
+            self.forms[group.key] = ("G%d" % len(self.forms), n, group.origin)
+        name, n, origin = self.forms[group.key]
+        return name, origin
+
+    def close(self):
+        """write the shared resources, the page tree and the rest (the file
+        itself is left open)
+        """
+        fonts = ["/%s %d 0 R" % (font, self.writer.add(
+            "<< /Type /Font /Subtype /Type1 /BaseFont /%s "
+            "/Encoding /WinAnsiEncoding >>" % font))
+                 for font in sorted(self.fonts)]
+        forms = ["/%s %d 0 R" % (name, n) for name, n, origin
+                 in sorted(self.forms.values())]
+        self.writer.add("<< /ProcSet [/PDF /Text] /Font << %s >> "
+                        "/XObject << %s >> >>" % (" ".join(fonts), " ".join(forms)),
+                        self.resources)
+        self.writer.add("<< /Type /Pages /Kids [%s] /Count %d >>" %
+                        (" ".join("%d 0 R" % k for k in self.kids), len(self.kids)),
+                        self.pages_num)
+        self.writer.add("<< /Type /Catalog /Pages %d 0 R >>" % self.pages_num,
+                        self.catalog)
+        self.writer.close(self.catalog)
+
+#
+# Backends: one class per output format.  The drawing objects in draw.py
+# only ever call these, so a new format is a new Backend (registered by
+# name), not a new method on every object.
+#
+identity = (1, 0, 0, 1, 0, 0)
+
+class Backend:
+    """An output format.  Drawing objects draw themselves by calling
+    rect(), line() and text() (and so on) on a backend, which emits to out
+    (an Emitter, or a file).  Each call returns the lines it emitted.
+
+    A whole document is begin_document(bounds), then the drawing, then
+    end_document(), which writes it all to out in one go:
+
+    backend = get_backend("svg")(outfile)
+    backend.begin_document(scene.bounds)
+    scene.draw(backend)
+    backend.end_document()
+
+    Everything is laid out once, in PostScript's coordinates (points, y
+    upwards).  matrix is the affine transform (a, b, c, d, e, f) from there
+    to the format's own coordinates, x' = a*x + c*y + e, y' = b*x + d*y + f,
+    and each backend applies it as it emits.  It's set by begin_document()
+    from page_matrix(), so drawing one thing on its own isn't transformed.
+    Text is moved but never scaled.
+    """
+    binary = False # True if documents are bytes, not text
+
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.document = None
+        self.bounds = None
+        self.matrix = identity
+
+    def page_matrix(self, bounds):
+        """the matrix for a document the size of bounds"""
+        return identity
+
+    def begin_document(self, bounds):
+        """start a document the size of bounds, the drawing is kept back
+        until end_document().  A backend can do any number of documents one
+        after another, each starts from scratch.
+        """
+        self.document, self.out = self.out, Emitter()
+        self.bounds = bounds
+        self.matrix = self.page_matrix(bounds)
+        return []
+
+    def point(self, x, y):
+        """(x, y) transformed by the matrix"""
+        a, b, c, d, e, f = self.matrix
+        return (a * x + c * y + e, b * x + d * y + f)
+
+    def box(self, x1, y1, x2, y2):
+        """the corners of a box transformed by the matrix, the smaller x and
+        y first (a flip swaps them)
+        """
+        x1, y1 = self.point(x1, y1)
+        x2, y2 = self.point(x2, y2)
+        return (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+
+    def end_document(self):
+        """finish the document and write it out, it is also returned"""
+        body, self.out = self.out, self.document
+        doc = self.finish(body.lines)
+        self.out.write(doc)
+        return doc
+
+    def finish(self, lines):
+        """the whole document around the drawing (a list of lines)"""
+        raise NotImplementedError
+
+    def rect(self, x1, y1, x2, y2, fill=False, color=1.0):
+        """a box with corners (x1, y1) and (x2, y2), outlined in black and,
+        if fill, filled with gray color (1.0 == white)
+        """
+        raise NotImplementedError
+
+    def line(self, x1, y1, x2, y2):
+        """a straight black line"""
+        return self.rect(x1, y1, x2, y2)
+
+    def text(self, x, y, txt, font="Helvetica", size=12, center=True):
+        """a line of text at (x, y), centered on x unless center is False"""
+        raise NotImplementedError
+
+    def text_block(self, x, y, lines, font="Helvetica", size=12, center=True):
+        """a list of lines of text below (x, y), the first (heading) line
+        at size and the rest a bit smaller
+        """
+        out = list()
+        offset = size
+        out.extend(self.text(x, y - offset, lines[0], font, size, center))
+        for line in lines[1:]:
+            offset = offset + (size - 2)
+            out.extend(self.text(x, y - offset, line, font, size - 2, center))
+        return out
+
+    def group(self, group):
+        """a draw.Group, by default just each of its objects"""
+        out = list()
+        for obj in group.objects:
+            out.extend(obj.draw(self))
+        return out
+
+class PSBackend(Backend):
+    """PostScript, using the procedures in the prolog.  The font is only set
+    when it changes: in a document (or with font_dicts, e.g. for a page of a
+    draw.PSDocument) from a font dictionary set up ahead of time, see
+    font_name(); otherwise with SF.
+    """
+    def __init__(self, out=sys.stdout, font_dicts=False):
+        Backend.__init__(self, out)
+        self.font_dicts = font_dicts
+        self.font = None     # the (font, size) currently set
+        self.fonts = dict()  # {(font, size): name} asked for so far
+
+    def begin_document(self, bounds):
+        self.font_dicts = True
+        self.font = None
+        self.fonts = dict()
+        return Backend.begin_document(self, bounds)
+
+    def finish(self, lines):
+        out = Emitter()
+        render_preamble(self.bounds, out, self.fonts)
+        out.emit(lines)
+        render_footer(out)
+        return out.getvalue()
+
+    def font_name(self, font, size):
+        """the name of the font dictionary for font at size (see
+        render_preamble), a new one is made up the first time
+        """
+        key = (font, size)
+        if key not in self.fonts:
+            self.fonts[key] = "f%d" % len(self.fonts)
+        return self.fonts[key]
+
+    def rect(self, x1, y1, x2, y2, fill=False, color=1.0):
+        x1, y1, x2, y2 = self.box(x1, y1, x2, y2)
+        return emit(box_lines(x1, y1, x2, y2, fill, color), self.out)
+
+    def text(self, x, y, txt, font="Helvetica", size=12, center=True):
+        x, y = self.point(x, y)
+        lines = list()
+        if self.font != (font, size):
+            if self.font_dicts:
+                lines.append("%s setfont" % self.font_name(font, size))
+            else:
+                lines.append("/%s %s SF" % (font, num(size)))
+            self.font = (font, size)
+        lines.append("%s %s (%s) %s" % (num(x), num(y), txt,
+                                        "C" if center else "L"))
+        return emit(lines, self.out)
+
+class SVGBackend(Backend):
+    """SVG, where y runs downwards from the top of the page: a document is
+    flipped so that it looks just like the PostScript one
+    """
+    def page_matrix(self, bounds):
+        return (1, 0, 0, -1, 0, bounds.height)
+
+    def finish(self, lines):
+        out = Emitter()
+        svg_render_preamble(self.bounds, out)
+        out.emit(lines)
+        svg_render_footer(out)
+        return out.getvalue()
+
+    def rect(self, x1, y1, x2, y2, fill=False, color=1.0):
+        x1, y1, x2, y2 = self.box(x1, y1, x2, y2)
+        return emit([svg_box_line(x1, y1, x2, y2, fill, color)], self.out)
+
+    def line(self, x1, y1, x2, y2):
+        x1, y1 = self.point(x1, y1)
+        x2, y2 = self.point(x2, y2)
+        return emit([svg_line(x1, y1, x2, y2)], self.out)
+
+    def text(self, x, y, txt, font="Helvetica", size=12, center=True):
+        x, y = self.point(x, y)
+        return emit([svg_text_line(x, y, txt, font, size, center)], self.out)
+
+class PDFBackend(Backend):
+    """PDF page content.  The fill gray and the font are only set when they
+    change.  pdf is the PDFFile the content goes into (if any), which lets
+    each Group be drawn just once.  A document is a one-page PDF (out must
+    be opened in binary mode).
+    """
+    binary = True
+
+    def __init__(self, out=sys.stdout, pdf=None):
+        Backend.__init__(self, out)
+        self.pdf = pdf
+        self.font = None     # the (font, size) currently set
+        self.fonts = set()   # fonts used
+        self.gray = 0.0      # the fill gray (None if not known)
+
+    def begin_document(self, bounds):
+        self.buffer = io.BytesIO() # the file is written in one go at the end
+        self.pdf = PDFFile(self.buffer, (bounds.min_x, bounds.min_y,
+                                         bounds.max_x, bounds.max_y))
+        self.font = None
+        self.fonts = set()
+        self.gray = 0.0
+        return Backend.begin_document(self, bounds)
+
+    def end_document(self):
+        """finish the document and write it out, it is also returned (as
+        bytes)
+        """
+        body, self.out = self.out, self.document
+        self.pdf.page(body.getvalue(), self.fonts)
+        self.pdf.close()
+        doc = self.buffer.getvalue()
+        self.out.write(doc)
+        return doc
+
+    def set_gray(self, color):
+        """the line setting the fill gray to color, if it isn't already"""
+        if self.gray == color:
+            return []
+        self.gray = color
+        return ["%s g" % num(color)]
+
+    def rect(self, x1, y1, x2, y2, fill=False, color=1.0):
+        x1, y1, x2, y2 = self.box(x1, y1, x2, y2)
+        r = "%s %s %s %s re" % (num(x1), num(y1), num(x2 - x1), num(y2 - y1))
+        if fill:
+            return emit(self.set_gray(color) + [r + " B"], self.out)
+        return emit([r + " S"], self.out)
+
+    def line(self, x1, y1, x2, y2):
+        x1, y1 = self.point(x1, y1)
+        x2, y2 = self.point(x2, y2)
+        return emit(["%s %s m %s %s l S" % (num(x1), num(y1), num(x2), num(y2))],
+                    self.out)
+
+    def text(self, x, y, txt, font="Helvetica", size=12, center=True):
+        x, y = self.point(x, y)
+        lines = self.set_gray(0.0)
+        if self.font != (font, size):
+            lines.append("/%s %s Tf" % (font, num(size)))
+            self.fonts.add(font)
+            self.font = (font, size)
+        if center:
+            x = x - text_width(txt, size) / 2.0
+        lines.append("BT %s %s Td %s Tj ET" % (num(x), num(y), pdf_string(txt)))
+        return emit(lines, self.out)
+
+    def group(self, group):
+        if self.pdf is None:
+            return Backend.group(self, group)
+        name, origin = self.pdf.form(group)
+        return emit(["q 1 0 0 1 %s %s cm /%s Do Q" %
+                     (num(group.origin.x - origin.x),
+                      num(group.origin.y - origin.y), name)], self.out)
+
+# the formats, by name
+backends = dict()
+
+def register_backend(name, backend):
+    """make a Backend class available as name"""
+    backends[name] = backend
+    return backend
+
+def get_backend(name):
+    """the Backend class called name"""
+    if name not in backends:
+        raise ValueError("No backend called %r (there's %s)" %
+                         (name, ", ".join(sorted(backends))))
+    return backends[name]
+
+register_backend("ps", PSBackend)
+register_backend("svg", SVGBackend)
+register_backend("pdf", PDFBackend)
@@ -0,0 +1,201 @@
+#!/bin/env python3
+"""Sanity checks for parsed schedules (the dict that parse_all returns).
+Run this directly to check all the .txt files in the current directory.
+"""
+import sys
+from heapq import heappush, heappop
+from sched_parser import parse_all
+from sched_util import to_min, time_to_str, IntervalList, default_periods, \
+                       ta_key
+
+class Conflict:
+    """Two sections that overlap in time.  where and other_where are the
+    (course, room) keys the sections came from.
+    """
+    def __init__(self, where, first, other_where, second):
+        self.where = where
+        self.first = first
+        self.other_where = other_where
+        self.second = second
+
+    def __eq__(self, other):
+        return self.where == other.where and \
+               self.first == other.first and \
+               self.other_where == other.other_where and \
+               self.second == other.second
+
+    def __str__(self):
+        def describe(key, sect):
+            return "%d_%d %s %s-%s %s" % (key[0], key[1], sect.day,
+                                          time_to_str(sect.start),
+                                          time_to_str(sect.end), sect.num)
+        return "%s overlaps %s" % (describe(self.where, self.first),
+                                   describe(self.other_where, self.second))
+
+    def __repr__(self):
+        return "Conflict(%s, %s, %s, %s)" % \
+            (self.where, self.first, self.other_where, self.second)
+
+def overlapping(intervals):
+    """Sweep over a list of (start, end, payload) intervals (in minutes) and
+    yield each pair of payloads whose intervals overlap, earlier-starting
+    one first.  Intervals that only touch (one ends as the other starts)
+    don't overlap.  This takes O(n log n) plus the number of overlaps.
+    """
+    active = list() # heap of (end, n, start, payload) still "open"
+    for n, (start, end, payload) in enumerate(sorted(intervals,
+                                                     key=lambda i: i[:2])):
+        while active and active[0][0] <= start:
+            heappop(active)
+        for other in sorted(active, key=lambda a: (a[2], a[1])):
+            yield (other[3], payload)
+        heappush(active, (end, n, start, payload))
+
+def by_room_and_day(data):
+    """{(room, day): [(start, end, (key, Section)), ...]} from parse_all's
+    dict.  Courses that share a room share a list.
+    """
+    out = dict()
+    for key in data:
+        course, room = key
+        for sect in data[key]:
+            out.setdefault((room, sect.day), list()).append(
+                (to_min(sect.start), to_min(sect.end), (key, sect)))
+    return out
+
+def find_conflicts(data):
+    """Every pair of sections booked into the same room at overlapping
+    times, as a list of Conflicts ordered by room, day and time.
+    """
+    conflicts = list()
+    index = by_room_and_day(data)
+    for room, day in sorted(index, key=lambda k: (k[0], "MTWRF".index(k[1]))):
+        for (k1, s1), (k2, s2) in overlapping(index[(room, day)]):
+            conflicts.append(Conflict(k1, s1, k2, s2))
+    return conflicts
+
+# TA "names" that mean nobody in particular
+NOT_A_TA = ("", "N/A", "TBA", "TBD", "STAFF")
+
+class TAIndex:
+    """Every TA's sections across all rooms, per weekday, as IntervalLists
+    so that "is this TA busy between start and end" is a walk down a tree
+    instead of over the whole department:
+
+    index = TAIndex(parse_all())
+    index.busy("Zeng", "M", (13, 0), (15, 0))  # [((103, 4320), Section...)]
+
+    Names are matched the way sched_util.ta_key does, so "Zeng" and "zeng "
+    are one TA (listed by tas() as first spelled).
+    """
+    def __init__(self, data):
+        lists = dict()
+        self.names = dict() # {ta_key: the name as first spelled}
+        for key in sorted(data):
+            for sect in data[key]:
+                ta = ta_key(sect.ta)
+                if ta.upper() in NOT_A_TA:
+                    continue
+                self.names.setdefault(ta, sect.ta.strip())
+                lists.setdefault((ta, sect.day), list()).append(
+                    (to_min(sect.start), to_min(sect.end), (key, sect)))
+        self.intervals = dict()
+        for k, iv in lists.items():
+            self.intervals[k] = IntervalList(iv)
+
+    def tas(self):
+        """all the TA names, sorted"""
+        return [self.names[ta] for ta in sorted(self.names)]
+
+    def sections(self, ta, day):
+        """[(key, Section), ...] for a TA on a day, in order of start time"""
+        ta = ta_key(ta)
+        if (ta, day) not in self.intervals:
+            return list()
+        return self.intervals[(ta, day)].payloads()
+
+    def busy(self, ta, day, start, end):
+        """the (key, Section)s the TA has on day that overlap start-end"""
+        ta = ta_key(ta)
+        if (ta, day) not in self.intervals:
+            return list()
+        return self.intervals[(ta, day)].overlapping(to_min(start), to_min(end))
+
+    def conflicts(self):
+        """every pair of one TA's sections that overlap, in any rooms"""
+        out = list()
+        for ta, day in sorted(self.intervals,
+                              key=lambda k: (k[0], "MTWRF".index(k[1]))):
+            for (k1, s1), (k2, s2) in overlapping(self.intervals[(ta, day)]):
+                out.append(Conflict(k1, s1, k2, s2))
+        return out
+
+def find_ta_conflicts(data):
+    """Every pair of sections where one TA is booked twice at once (across
+    all rooms), as a list of Conflicts ordered by TA, day and time.
+    """
+    return TAIndex(data).conflicts()
+
+class Outside:
+    """A section that doesn't fit in the periods of the day (a PeriodTable),
+    where is the (course, room) key it came from.  It's left off the
+    placard if none of it is in the periods, and cut off otherwise.
+    """
+    def __init__(self, where, sect, periods):
+        self.where = where
+        self.sect = sect
+        self.periods = periods
+
+    def __eq__(self, other):
+        return self.where == other.where and self.sect == other.sect
+
+    def __str__(self):
+        sect, times = self.sect, self.periods.times
+        if self.periods.overlaps(sect.start, sect.end):
+            what = "runs past"
+        else:
+            what = "is outside"
+        return "%d_%d %s %s-%s %s %s %s-%s" % \
+            (self.where[0], self.where[1], sect.day, time_to_str(sect.start),
+             time_to_str(sect.end), sect.num, what, time_to_str(times[0]),
+             time_to_str(times[-1]))
+
+    def __repr__(self):
+        return "Outside(%s, %s)" % (self.where, self.sect)
+
+def find_outside(data, periods=None):
+    """Every section that doesn't fit (all or in part) in periods (the
+    standard day if not given), as a list of Outsides ordered by room, day
+    and time.
+    """
+    if periods is None:
+        periods = default_periods
+    out = list()
+    for key in sorted(data):
+        for sect in data[key]:
+            if not periods.contains(sect.start, sect.end):
+                out.append(Outside(key, sect, periods))
+    out.sort(key=lambda o: (o.where, "MTWRF".index(o.sect.day), o.sect.start))
+    return out
+
+def report(conflicts, title, toFile=None):
+    """print a list of problems (if there are any) to toFile (stderr if not
+    given), return how many
+    """
+    if toFile is None:
+        toFile = sys.stderr
+    if conflicts:
+        print("%s (%d):" % (title, len(conflicts)), file=toFile)
+        for c in conflicts:
+            print("  %s" % c, file=toFile)
+    return len(conflicts)
+
+def main():
+    data = parse_all()
+    n = report(find_conflicts(data), "Room conflicts", sys.stdout)
+    n += report(find_ta_conflicts(data), "TA double-bookings", sys.stdout)
+    n += report(find_outside(data), "Sections outside the periods", sys.stdout)
+    return 1 if n else 0
+
+if __name__ == "__main__": # pragma: no cover
+    sys.exit(main())
@@ -1,9 +1,8 @@
 import sys
-import os
 from PyQt4 import QtCore, QtGui
 from auto_main import Ui_MainWindow
 from auto_about import Ui_Dialog
-from scheduler import schedule_grid_svg, add_section_svg
+from scheduler import schedule_grid, add_sections
 from draw import Scene, Rectangle, Point
 from sched_parser import parse_line
 from sched_util import Section
@@ -18,7 +17,7 @@ class MyWindow(QtGui.QMainWindow):
         self.title = "Untitled"
         self.r = Rectangle(Point(0,0), Point(850,500))
         self.s = Scene(self.r)
-        self.s = schedule_grid_svg(self.title, self.s, self.r)
+        self.s = schedule_grid(self.title, self.s, self.r)
         self.numobjects = 0
         self.min_objects = len(self.s.objects)
 
@@ -27,7 +26,6 @@ class MyWindow(QtGui.QMainWindow):
         self.ui.actionPrint.setShortcut("Ctrl+S")
         self.ui.actionQuit.setShortcut("Ctrl+Q")
 
-        self.null = open(os.devnull, "w")
         self.refresh_scene()
         
     def on_pushButton_pressed(self):
@@ -42,7 +40,7 @@ class MyWindow(QtGui.QMainWindow):
                 added_objects = list()
             self.r = Rectangle(Point(0,0), Point(850,500))
             self.s = Scene(self.r)
-            self.s = schedule_grid_svg(title, self.s, self.r)
+            self.s = schedule_grid(title, self.s, self.r)
             self.s.objects.extend(added_objects)
             self.numobjects = len(added_objects)
 
@@ -57,7 +55,7 @@ class MyWindow(QtGui.QMainWindow):
         section = self.ui.section_number.value()
 
         sect = Section(day, (start_h, start_m), section, ta, (end_h, end_m))
-        add_section_svg(sect, self.s, self.r)
+        add_sections([sect], self.s, self.r)
         self.numobjects += 1
         self.refresh_scene()
 
@@ -83,8 +81,7 @@ class MyWindow(QtGui.QMainWindow):
         QtCore.QCoreApplication.quit()
 
     def refresh_scene(self):
-        byts = bytes(self.s.render_svg(self.null), encoding='utf8')
-        txt = QtCore.QByteArray(byts)
+        txt = QtCore.QByteArray(self.s.to_svg_bytes())
         self.ui.svgWidget.load(txt)
 
     def info_box(self, msg):
@@ -1,70 +1,251 @@
+import hashlib
+import io
+import json
 import os
+import pickle
+import re
 from pyparsing import Word, alphas, nums, oneOf 
 from sched_util import Section
 
-def parse_line(txt):
-    # Pseudo BNF for config format
-    #  <dow>,<start> <sectionPart> <end>
-    #
-    # dow         := "M" | "T" | "W" | "R" | "F"
-    # start       := digits ":" digits
-    # sectionPart := specSection | digits name | "c" | "C"
-    # specSection := "(" digits ")" digits
-    # end         := digits ":" digits
-    # name        := alpha
-
-    day_of_week = oneOf(list("MTWRF"))
-    time        = Word(nums) + ":" + Word(nums)
-    start_block = day_of_week + "," + time
-    name        = Word(alphas + "'" + " " + "/")  # what's in a name?
-    section     = Word(nums)
-    specSection = "(" + Word(nums) + ")" + section
-    sectionPart = specSection + name | section + name | oneOf(list("Cc"))
-    line        = start_block + sectionPart + time
-
-    # Parse Actions (run when a parse succeeds)
-    # group the times and the start block as a single string, get rid of
-    # possible trailing blanks on names
-    time.setParseAction(lambda x: [i for i in x if i != ':'])
-    start_block.setParseAction(lambda x: [i for i in x if i != ','])
-    name.setParseAction(lambda x: x[0].strip())
-    # format the specSection better
-    specSection.setParseAction(lambda x: "(%s) %s" % (x[1], x[3]))
-    def if_c_then_uppercase(x):
-        """If the sectionPart is a consultation block, always use an upper C"""
-        if x[0] == "c" or x[0] == "C":
-            return "C"
-        else:
-            return x
-    sectionPart.setParseAction(if_c_then_uppercase)
+class SectionGrammar:
+    """The pyparsing grammar for one line of a schedule file.  Building the
+    grammar is far more expensive than matching against it, so build one of
+    these (or use get_grammar()) and reuse it for every line.
+    """
+    def __init__(self):
+        # Pseudo BNF for config format
+        #  <dow>,<start> <sectionPart> <end>
+        #
+        # dow         := "M" | "T" | "W" | "R" | "F"
+        # start       := digits ":" digits
+        # sectionPart := specSection | digits name | "c" | "C"
+        # specSection := "(" digits ")" digits
+        # end         := digits ":" digits
+        # name        := alpha
 
-    # parses to a list of items ['M', '12', '05', '301',       'Ojalvo',  '14', '00'] or
-    #             (multi)       ['T', '14', '25', '(321) 301', 'Dhorkah', '17', '25'] or
-    #             (consult)     ['F', '8',  '00', 'C',                    '15', '00']
-    items = line.parseString(txt)
-    if len(items) == 6:
-        # consultation (no TA name)
-        day, h1, m1, sect, h2, m2 = items
-        return Section(day, (int(h1), int(m1)), sect, "", (int(h2), int(m2)))
+        day_of_week = oneOf(list("MTWRF"))
+        time        = Word(nums) + ":" + Word(nums)
+        start_block = day_of_week + "," + time
+        name        = Word(alphas + "'" + " " + "/")  # what's in a name?
+        section     = Word(nums)
+        specSection = "(" + Word(nums) + ")" + section
+        sectionPart = specSection + name | section + name | oneOf(list("Cc"))
+        line        = start_block + sectionPart + time
 
-    day, h1, m1, sect, ta, h2, m2 = items
-    return Section(day, (int(h1), int(m1)), sect, ta, (int(h2),int(m2)))
+        # Parse Actions (run when a parse succeeds)
+        # group the times and the start block as a single string, get rid of
+        # possible trailing blanks on names
+        time.setParseAction(lambda x: [i for i in x if i != ':'])
+        start_block.setParseAction(lambda x: [i for i in x if i != ','])
+        name.setParseAction(lambda x: x[0].strip())
+        # format the specSection better
+        specSection.setParseAction(lambda x: "(%s) %s" % (x[1], x[3]))
+        def if_c_then_uppercase(x):
+            """If the sectionPart is a consultation block, always use an upper C"""
+            if x[0] == "c" or x[0] == "C":
+                return "C"
+            else:
+                return x
+        sectionPart.setParseAction(if_c_then_uppercase)
 
-def parse_all_lines(txt):
-    """Parse a block of text (has newlines), return as a list of Section
-    objects
+        self.line = line
+
+    def parse_line(self, txt):
+        """Parse a single line of text into a Section"""
+        # parses to a list of items ['M', '12', '05', '301',       'Ojalvo',  '14', '00'] or
+        #             (multi)       ['T', '14', '25', '(321) 301', 'Dhorkah', '17', '25'] or
+        #             (consult)     ['F', '8',  '00', 'C',                    '15', '00']
+        items = self.line.parseString(txt)
+        if len(items) == 6:
+            # consultation (no TA name)
+            day, h1, m1, sect, h2, m2 = items
+            return Section(day, (int(h1), int(m1)), sect, "", (int(h2), int(m2)))
+
+        day, h1, m1, sect, ta, h2, m2 = items
+        return Section(day, (int(h1), int(m1)), sect, ta, (int(h2),int(m2)))
+
+    def parse_lines(self, lines):
+        """Parse each line of an iterable of lines, return a list of Section
+        objects.  Comments and short (blank) lines are skipped.
+        """
+        out = list()
+        for line in lines:
+            line = line.strip()
+            if line.startswith("#") or len(line) < 5:
+                continue
+            out.append(self.parse_line(line))
+        return out
+
+# the shared grammar, built the first time somebody needs it
+_grammar = None
+
+def get_grammar():
+    """Return the process-wide SectionGrammar, building it if necessary"""
+    global _grammar
+    if _grammar is None:
+        _grammar = SectionGrammar()
+    return _grammar
+
+# Fast path for the common line shapes:
+#
+#   M,12:05 301      Ojalvo    14:00
+#   T,14:25 (321)301 Dhorkah   17:25
+#   F,8:00  C                  15:00
+#
+# It only accepts a strict subset of what the grammar does (no blanks inside
+# "M,12:05" or "(321)301") and gives the same answer whenever it matches.
+# Anything else falls through to the full pyparsing grammar.
+_ws = r"[ \t\r\n]*"
+_num = r"([0-9]+)(?![0-9])"   # like Word(nums): ASCII, never give digits back
+_fast_line = re.compile(
+    _ws + r"([MTWRF])," + _num + ":" + _num + _ws +
+    r"(?:\(" + _num + r"\)" + _num + _ws + r"([A-Za-z'/][A-Za-z'/ ]*)"   # (321)301 name
+    r"|" + _num + _ws + r"([A-Za-z'/][A-Za-z'/ ]*)"                     # 301 name
+    r"|([Cc]))" + _ws +                                                  # consultation
+    _num + ":" + _num)
+
+def fast_parse_line(txt):
+    """Parse a line with the fast tokenizer, return None if it can't"""
+    m = _fast_line.match(txt)
+    if m is None:
+        return None
+    day, h1, m1, course, spec, spec_ta, sect, ta, consult, h2, m2 = m.groups()
+    if consult:
+        sect, ta = "C", ""
+    elif spec:
+        sect, ta = "(%s) %s" % (course, spec), spec_ta.strip()
+    else:
+        ta = ta.strip()
+    return Section(day, (int(h1), int(m1)), sect, ta, (int(h2), int(m2)))
+
+def parse_line(txt):
+    """Parse a single line of a schedule file into a Section"""
+    sect = fast_parse_line(txt)
+    if sect is None:
+        sect = get_grammar().parse_line(txt)
+    return sect
+
+def iter_sections(lines, start=1):
+    """Lazily parse an iterable of lines (e.g. an open file), yielding one
+    Section at a time.  Each Section's lineno is set to its line number in
+    the input, counting the first line as start.
     """
-    txt = txt.split("\n")
-    out = list()
-    for line in txt:
+    for lineno, line in enumerate(lines, start):
         line = line.strip()
         if line.startswith("#") or len(line) < 5:
             continue
         sect = parse_line(line)
-        out.append(sect)
-    return out
+        sect.lineno = lineno
+        yield sect
+
+def parse_all_lines(txt):
+    """Parse a block of text (has newlines), return as a list of Section
+    objects
+    """
+    return list(iter_sections(io.StringIO(txt)))
+
+class ParseCache:
+    """An on-disk cache of parsed schedule files (or whole merged files).
+    Entries are keyed by the file's absolute path and remember its size,
+    mtime and a SHA-1 of its contents.  If the size and mtime match, the file is not even read;
+    otherwise a matching hash still counts as a hit (e.g. after a touch).
+    At most max_entries files are remembered, least recently used go first.
+
+    cache = ParseCache()
+    data = parse_all(cache=cache)
+    cache.save()
+    """
+    version = 2 # bump when Section or the parse results change
+
+    def __init__(self, path=".sched_cache", max_entries=1024):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = dict()
+        self.pending = dict() # stamps of files that missed, waiting for put()
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self):
+        """(re)read the cache file, a missing or unreadable one is empty"""
+        try:
+            with open(self.path, 'rb') as f:
+                version, entries = pickle.load(f)
+        except Exception:
+            version, entries = None, dict()
+        if version != self.version:
+            entries = dict()
+        self.entries = entries
+        self.dirty = False
+
+    def save(self):
+        """write the cache back to disk if anything changed"""
+        if not self.dirty:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, 'wb') as f:
+            pickle.dump((self.version, self.entries), f)
+        os.replace(tmp, self.path)
+        self.dirty = False
+
+    def stamp(self, filename, st=None):
+        """return (size, mtime, content hash) for a file"""
+        if st is None:
+            st = os.stat(filename)
+        h = hashlib.sha1()
+        with open(filename, 'rb') as f:
+            # a bit at a time, a merged file can be the whole department
+            for block in iter(lambda: f.read(65536), b""):
+                h.update(block)
+        return (st.st_size, st.st_mtime_ns, h.hexdigest())
 
-def parse_file(filename):
+    def get(self, filename):
+        """return the cached Section list for filename, or None"""
+        key = os.path.abspath(filename)
+        st = os.stat(filename)
+        entry = self.entries.pop(key, None)
+        if entry is not None and entry[:2] == (st.st_size, st.st_mtime_ns):
+            self.entries[key] = entry # most recently used
+            self.hits += 1
+            return entry[3]
+        stamp = self.stamp(filename, st)
+        if entry is not None and entry[2] == stamp[2]:
+            self.entries[key] = stamp + (entry[3],)
+            self.dirty = True
+            self.hits += 1
+            return entry[3]
+        self.pending[key] = stamp
+        self.misses += 1
+        return None
+
+    def put(self, filename, sect_list):
+        """remember the Section list parsed from filename"""
+        key = os.path.abspath(filename)
+        stamp = self.pending.pop(key, None)
+        if stamp is None:
+            stamp = self.stamp(filename)
+        self.entries.pop(key, None)
+        self.entries[key] = stamp + (sect_list,)
+        while len(self.entries) > self.max_entries:
+            del self.entries[next(iter(self.entries))]
+        self.dirty = True
+
+    def invalidate(self, filename=None):
+        """forget one file, or everything if filename is None"""
+        if filename is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(os.path.abspath(filename), None)
+        self.dirty = True
+
+def room_key(filename):
+    """(course, room) for a filename like 103_4320.txt"""
+    k = os.path.basename(filename)[:-4] # drop ".txt"
+    course, room = k.split("_")
+    return (int(course), int(room))
+
+def parse_file(filename, cache=None):
     """Return a dict like: 
 
     {(103,4320):
@@ -73,22 +254,204 @@ def parse_file(filename):
        ]
       }
     }
+
+    If a ParseCache is given, it is consulted first (and updated).
     """
-    k = filename[:-4] # drop ".txt"
-    course, room = k.split("_")
-    with open(filename, 'r') as f:
-        sect_list = parse_all_lines(f.read())
-    return ((int(course), int(room)), sect_list)
+    sect_list = None
+    if cache is not None:
+        sect_list = cache.get(filename)
+    if sect_list is None:
+        with open(filename, 'r') as f:
+            sect_list = list(iter_sections(f))
+        if cache is not None:
+            cache.put(filename, sect_list)
+    return (room_key(filename), sect_list)
 
-def parse_all():
-    files = filter(lambda f: f.endswith(".txt"), os.listdir("."))
+def parse_all(workers=None, cache=None, merged=None):
+    """Parse every <course>_<room>.txt file in the current directory.  If
+    workers is more than 1, the files are parsed in that many processes.
+    Either way the result is keyed in filename order.  Files that a
+    ParseCache (if given) already knows about are not parsed at all.
+    If merged names a merged file (see below), it's read instead.
+    """
+    if merged is not None:
+        return parse_merged(merged, cache)
+    files = sorted(filter(lambda f: f.endswith(".txt"), os.listdir(".")))
+    parsed = dict()
+    if cache is not None:
+        for filename in files:
+            sect_list = cache.get(filename)
+            if sect_list is not None:
+                parsed[filename] = sect_list
+    todo = [f for f in files if f not in parsed]
+    if workers and workers > 1 and len(todo) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        chunk = max(1, len(todo) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(parse_file, todo, chunksize=chunk))
+    else:
+        results = map(parse_file, todo)
+    for filename, (k, d) in zip(todo, results):
+        parsed[filename] = d
+        if cache is not None:
+            cache.put(filename, d)
     out = dict()
     for filename in files:
-        k, d = parse_file(filename)
-        out[k] = d
+        out[room_key(filename)] = parsed[filename]
     return out
 
+#
+# Merged input: every room in one file, in blocks like
+#
+#   [103 4320]
+#   M,12:05 301      Ojalvo    14:00
+#   T,14:25 (321)301 Dhorkah   17:25
+#   [104 2223]
+#   ...
+#
+# Reading one room needn't parse the others: an index of where each block
+# starts is kept next to the file (see room_index).
+#
+_header = re.compile(r"\s*\[\s*(\d+)[\s_]+(\d+)\s*\]\s*$")
+INDEX_VERSION = 1
+
+def scan_merged(f):
+    """Split a merged file (opened in binary mode) into its blocks,
+    yielding (key, offset, length, lineno, lines) for each.  offset and
+    length are the bytes of the block's lines (not its header), lineno is
+    the line number of its first line.
+    """
+    key, offset, lineno, lines = None, 0, 1, list()
+    pos = 0
+    for n, raw in enumerate(f, 1):
+        line = raw.decode("utf8")
+        m = _header.match(line)
+        if m:
+            if key is not None:
+                yield (key, offset, pos - offset, lineno, lines)
+            key = (int(m.group(1)), int(m.group(2)))
+            offset, lineno, lines = pos + len(raw), n + 1, list()
+        elif key is not None:
+            lines.append(line)
+        elif not (line.strip().startswith("#") or len(line.strip()) < 5):
+            raise ValueError("line %d: section before any [course room]" % n)
+        pos += len(raw)
+    if key is not None:
+        yield (key, offset, pos - offset, lineno, lines)
+
+def parse_merged(filename, cache=None):
+    """Parse a whole merged file, returns a dict like parse_all()'s (in file
+    order).  If a ParseCache is given, it is consulted first (and updated).
+    """
+    if cache is not None:
+        data = cache.get(filename)
+        if data is not None:
+            return data
+    data = dict()
+    with open(filename, 'rb') as f:
+        for key, offset, length, lineno, lines in scan_merged(f):
+            if key in data:
+                raise ValueError("line %d: %d %d appears twice" %
+                                 ((lineno - 1,) + key))
+            data[key] = list(iter_sections(lines, lineno))
+    if cache is not None:
+        cache.put(filename, data)
+    return data
+
+def index_name(filename):
+    return filename + ".idx"
+
+def scan_index(filename):
+    """The index of a merged file, worked out by scanning it: a dict of
+    {(course, room): (offset, length, lineno)}
+    """
+    index = dict()
+    with open(filename, 'rb') as f:
+        for key, offset, length, lineno, lines in scan_merged(f):
+            index[key] = (offset, length, lineno)
+    return index
+
+def save_index(filename, index, st):
+    """Write the index of a merged file, st is the os.stat of the file it
+    was scanned from
+    """
+    rooms = [list(key) + list(index[key]) for key in index]
+    tmp = index_name(filename) + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump({"version": INDEX_VERSION, "size": st.st_size,
+                   "mtime_ns": st.st_mtime_ns, "rooms": rooms}, f)
+    os.replace(tmp, index_name(filename))
+
+def build_index(filename):
+    """Scan a merged file and write its index, returns the index"""
+    st = os.stat(filename)
+    index = scan_index(filename)
+    save_index(filename, index, st)
+    return index
+
+def load_index(filename):
+    """The index of a merged file, or None if there's none, or the file has
+    changed since it was written
+    """
+    st = os.stat(filename)
+    try:
+        with open(index_name(filename), 'r') as f:
+            saved = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (saved.get("version"), saved.get("size"), saved.get("mtime_ns")) != \
+       (INDEX_VERSION, st.st_size, st.st_mtime_ns):
+        return None
+    return dict(((c, r), (offset, length, lineno))
+                for c, r, offset, length, lineno in saved["rooms"])
+
+def room_index(filename):
+    """The index of a merged file, (re)built if need be.  If it can't be
+    written (e.g. the merged file is somewhere read-only) the one just
+    scanned is used anyway, it's only a shortcut.
+    """
+    index = load_index(filename)
+    if index is None:
+        st = os.stat(filename)
+        index = scan_index(filename)
+        try:
+            save_index(filename, index, st)
+        except OSError:
+            pass
+    return index
+
+def parse_room(filename, key):
+    """Like parse_file(), but for one (course, room) of a merged file: seeks
+    straight to its block (using the index) and parses only that.  Raises
+    KeyError if the file has no such room.
+    """
+    offset, length, lineno = room_index(filename)[key]
+    with open(filename, 'rb') as f:
+        f.seek(offset)
+        block = f.read(length).decode("utf8")
+    return (key, list(iter_sections(io.StringIO(block), lineno)))
+
+def format_section(sect):
+    """A Section as a line of a schedule file"""
+    return "%s,%d:%02d %-9s %-10s %d:%02d" % \
+        (sect.day, sect.start[0], sect.start[1], sect.num.replace(" ", ""),
+         sect.ta, sect.end[0], sect.end[1])
+
+def write_merged(data, filename):
+    """Write a dict like parse_all()'s out as one merged file"""
+    with open(filename, 'w') as f:
+        for key in data:
+            print("[%d %d]" % key, file=f)
+            for sect in data[key]:
+                print(format_section(sect), file=f)
+
 if __name__ == "__main__": # pragma: no cover
-    import pprint
-    pp = pprint.PrettyPrinter(indent=2)
-    pp.pprint(parse_all())
+    import sys
+    if len(sys.argv) > 1:
+        # sched_parser.py OUT: merge all the .txt files into OUT (and index it)
+        write_merged(parse_all(), sys.argv[1])
+        build_index(sys.argv[1])
+    else:
+        import pprint
+        pp = pprint.PrettyPrinter(indent=2)
+        pp.pprint(parse_all())
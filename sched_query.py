@@ -0,0 +1,234 @@
+#!/bin/env python3
+"""Look things up in a parsed schedule (the dict that parse_all returns)
+without grepping through the .txt files.  Run this directly for a small
+command line version, e.g.:
+
+    sched_query.py ta Zeng
+    sched_query.py section "(321)301"
+    sched_query.py room 4320 T 14:30
+    sched_query.py free M 13:00 15:00
+    sched_query.py slot W 110 8:00 17:00
+"""
+import re
+import sys
+from sched_parser import parse_all
+from sched_util import to_min, from_min, time_to_str, IntervalList, \
+                       default_periods, ta_key
+
+def section_number(num):
+    """normalize a section number, "(321)301" and "(321) 301" are the same"""
+    m = re.match(r"\s*\(\s*(\d+)\s*\)\s*(\d+)\s*$", str(num))
+    if m:
+        return "(%s) %s" % m.groups()
+    return str(num).strip()
+
+class ScheduleIndex:
+    """Hash maps and per-day IntervalLists over every section, built once:
+
+    index = ScheduleIndex(parse_all())
+    index.by_ta("Zeng")              # [((103, 4320), Section...), ...]
+    index.by_section("301")          # 301 and e.g. (321) 301 in any room
+    index.in_room(4320, "T", (14, 30))
+    index.free_rooms("M", (13, 0), (15, 0))
+
+    Results are (key, Section) pairs, where key is the (course, room) the
+    section came from.  Rooms are room numbers; courses that share a room
+    share its bookings.
+    """
+    def __init__(self, data):
+        self.tas = dict()
+        self.sections = dict()
+        self.days = dict()
+        per_room = dict()
+        for key in sorted(data):
+            course, room = key
+            per_room.setdefault(room, dict())
+            for sect in data[key]:
+                entry = (key, sect)
+                self.tas.setdefault(ta_key(sect.ta), list()).append(entry)
+                num = section_number(sect.num)
+                self.sections.setdefault(num, list()).append(entry)
+                if num.startswith("("):
+                    # also findable by its plain number
+                    plain = num.split()[-1]
+                    self.sections.setdefault(plain, list()).append(entry)
+                self.days.setdefault(sect.day, list()).append(entry)
+                per_room[room].setdefault(sect.day, list()).append(
+                    (to_min(sect.start), to_min(sect.end), entry))
+        by_time = lambda e: ("MTWRF".index(e[1].day), e[1].start, e[0])
+        for d in (self.tas, self.sections, self.days):
+            for k in d:
+                d[k].sort(key=by_time)
+        self.rooms = dict()
+        for room in per_room:
+            self.rooms[room] = dict((day, IntervalList(iv))
+                                    for day, iv in per_room[room].items())
+
+    def by_ta(self, name):
+        """every section the TA has (case doesn't matter)"""
+        return list(self.tas.get(ta_key(name), ()))
+
+    def by_section(self, num):
+        """sections numbered num, "301" also finds "(321) 301" and the like"""
+        return list(self.sections.get(section_number(num), ()))
+
+    def by_day(self, day):
+        """every section on the given day, in order of start time"""
+        return list(self.days.get(day, ()))
+
+    def in_room(self, room, day, time):
+        """what's going on in room (a room number) at day and time"""
+        if day not in self.rooms.get(room, {}):
+            return list()
+        return self.rooms[room][day].at(to_min(time))
+
+    def booked(self, room, day, start, end):
+        """the bookings in room that overlap start-end on day"""
+        if day not in self.rooms.get(room, {}):
+            return list()
+        return self.rooms[room][day].overlapping(to_min(start), to_min(end))
+
+    def free_rooms(self, day, start, end):
+        """the rooms (numbers, sorted) with nothing booked from start to end
+        on day
+        """
+        return [room for room in sorted(self.rooms)
+                if not self.booked(room, day, start, end)]
+
+class FreeSlots:
+    """The complement of every room's bookings, per weekday, between the
+    first and last of the periods (default_periods unless given).  All the
+    rooms' free gaps for a day go in one IntervalList, so asking for a slot
+    takes O((k+1) log n) for the k gaps that overlap the window, not a
+    walk over every room:
+
+    slots = FreeSlots(parse_all())
+    slots.find("W", 110, (8, 0), (17, 0))   # [(2223, ((8, 0), (9, 50))), ...]
+    """
+    def __init__(self, data, periods=None):
+        if periods is None:
+            periods = default_periods
+        self.periods = periods
+        self.day_start = periods.minutes[0]
+        self.day_end = periods.minutes[-1]
+        booked = dict()
+        for course, room in data:
+            booked.setdefault(room, dict())
+            for sect in data[(course, room)]:
+                booked[room].setdefault(sect.day, list()).append(
+                    (to_min(sect.start), to_min(sect.end)))
+        self.rooms = sorted(booked)
+        self.days = dict()
+        self.room_gaps = dict() # {(room, day): [(start, end), ...]}
+        for day in "MTWRF":
+            gaps = list()
+            for room in self.rooms:
+                free = self.complement(booked[room].get(day, ()))
+                self.room_gaps[(room, day)] = free
+                for start, end in free:
+                    gaps.append((start, end, (room, start, end)))
+            self.days[day] = IntervalList(gaps)
+
+    def complement(self, intervals):
+        """the free (start, end) gaps in the day around intervals (in
+        minutes, they may overlap each other)
+        """
+        gaps = list()
+        free_from = self.day_start
+        for start, end in sorted(intervals):
+            if start > free_from:
+                gaps.append((free_from, min(start, self.day_end)))
+            free_from = max(free_from, end)
+            if free_from >= self.day_end:
+                break
+        if free_from < self.day_end:
+            gaps.append((free_from, self.day_end))
+        return [g for g in gaps if g[0] < g[1]]
+
+    def check_day(self, day):
+        if day not in self.days:
+            raise ValueError("Day must be one of MTWRF")
+
+    def gaps(self, room, day):
+        """[(start, end), ...] free times for a room on a day"""
+        self.check_day(day)
+        return [(from_min(s), from_min(e))
+                for s, e in self.room_gaps.get((room, day), ())]
+
+    def find(self, day, length, start=None, end=None):
+        """rooms free for length minutes on day somewhere between start and
+        end (the whole day if not given): [(room, (start, end)), ...] sorted
+        by room, with the earliest fitting part of the window for each.  A
+        day that isn't one of MTWRF is a ValueError.
+        """
+        self.check_day(day)
+        lo = self.day_start if start is None else to_min(start)
+        hi = self.day_end if end is None else to_min(end)
+        found = dict()
+        for room, s, e in self.days[day].overlapping(lo, hi):
+            s, e = max(s, lo), min(e, hi)
+            if e - s >= length and room not in found:
+                found[room] = (from_min(s), from_min(e))
+        return [(room, found[room]) for room in sorted(found)]
+
+    def free_rooms(self, day, length, start=None, end=None):
+        """just the room numbers from find()"""
+        return [room for room, slot in self.find(day, length, start, end)]
+
+def parse_time(txt):
+    """"14:30" -> (14, 30)"""
+    h, m = txt.split(":")
+    return (int(h), int(m))
+
+def describe(entry):
+    (course, room), sect = entry
+    return "%d_%d %s %s-%s %s %s" % (course, room, sect.day,
+                                     time_to_str(sect.start),
+                                     time_to_str(sect.end), sect.num, sect.ta)
+
+def parse_day(txt):
+    """"T" -> "T", anything but one of MTWRF is a ValueError"""
+    if len(txt) != 1 or txt not in "MTWRF":
+        raise ValueError("Day must be one of MTWRF")
+    return txt
+
+def main(args):
+    usage = "usage: sched_query.py ta NAME | section NUM | day D | " \
+            "room ROOM D H:MM | free D H:MM H:MM | slot D MINUTES [H:MM H:MM]"
+    what, rest = (args[0], args[1:]) if args else (None, [])
+    # check all the arguments before reading any schedules
+    try:
+        if what in ("ta", "section") and len(rest) == 1:
+            query = [rest[0]]
+        elif what == "day" and len(rest) == 1:
+            query = [parse_day(rest[0])]
+        elif what == "room" and len(rest) == 3:
+            query = [int(rest[0]), parse_day(rest[1]), parse_time(rest[2])]
+        elif what == "free" and len(rest) == 3:
+            query = [parse_day(rest[0]), parse_time(rest[1]),
+                     parse_time(rest[2])]
+        elif what == "slot" and len(rest) in (2, 4):
+            query = [parse_day(rest[0]), int(rest[1])] + \
+                    [parse_time(t) for t in rest[2:]]
+        else:
+            raise ValueError(what)
+    except ValueError:
+        print(usage, file=sys.stderr)
+        return 2
+    if what == "slot":
+        for room, (start, end) in FreeSlots(parse_all()).find(*query):
+            print("%d %s-%s" % (room, time_to_str(start), time_to_str(end)))
+        return 0
+    index = ScheduleIndex(parse_all())
+    if what == "free":
+        for room in index.free_rooms(*query):
+            print(room)
+        return 0
+    lookup = {"ta": index.by_ta, "section": index.by_section,
+              "day": index.by_day, "room": index.in_room}
+    for entry in lookup[what](*query):
+        print(describe(entry))
+    return 0
+
+if __name__ == "__main__": # pragma: no cover
+    sys.exit(main(sys.argv[1:]))
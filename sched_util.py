@@ -4,16 +4,24 @@
 # is sorta low-level, other modules should only need:
 #
 # start_times
+# PeriodTable
+# GridLayout
 # timeslot
+# timeslots
+# visible
 # x_time
 # y_time
 # time_to_str
 
+import re
+from bisect import bisect_left, bisect_right
 from draw import Rectangle, Point
 
 class Section:
     """Information about a scheduled section"""
-    def __init__(self, day, start, num, ta, end):
+    __slots__ = ("day", "start", "num", "ta", "end", "lineno")
+
+    def __init__(self, day, start, num, ta, end, lineno=None):
         if day in "MTWRF":
             self.day = day
         else:
@@ -22,6 +30,7 @@ class Section:
         self.num = num
         self.ta = ta
         self.end = end
+        self.lineno = lineno # where this came from in the input (if known)
 
     def __eq__(self, other):
         return self.day == other.day and \
@@ -37,18 +46,59 @@ class Section:
 start_times = [(7,45),  (8,50),  (9,55), (11,0), (12,5), (13,20),
                (14,25), (15,30), (16,35), (19,5), (21,0), (22,0), (23,0)]
 
-# calculate timespan from start_times (if you need this, uncomment)
-#max_time = start_times[-1][0]*60 + start_times[-1][1]
-#min_time = start_times[0][0]*60 + start_times[0][1]
-#timespan = max_time - min_time # 915 min
+# the default periods (and their timespan, 915 min) are set up as a
+# PeriodTable below, see default_periods and timespan
+
+class GridLayout:
+    """The measurements of one schedule grid, worked out once from its
+    canvas (the shaded background Rectangle) so that placing sections is
+    just arithmetic.  The geometry helpers below take either a Scene or a
+    GridLayout; given a Scene they use layout_of(scene).
+    """
+    def __init__(self, canvas, periods=None):
+        if periods is None:
+            periods = default_periods
+        self.canvas = canvas
+        self.periods = periods
+        self.min_x = canvas.min_x
+        self.min_y = canvas.min_y
+        self.max_y = canvas.max_y
+        self.day_width = canvas.width / 6.0
+        self.scale = 1.0 * canvas.height / periods.timespan # points per minute
+        self.first_period = periods.first
+        # left edge of each day column, the "_" is for the label column :)
+        self.day_x = dict((d, i * self.day_width + self.min_x)
+                          for i, d in enumerate("_MTWRF"))
+
+    def minutes(self, m):
+        """convert from time-based minutes to screen (vert) distance"""
+        return self.scale * m
+
+    def y_time(self, time):
+        """the y position within the grid of the given time"""
+        return self.max_y - self.scale * (to_min(time) - self.first_period)
 
-# if this changes, comment it and then uncomment the above 3 lines
-timespan = 915
+    def x_time(self, day):
+        """the left edge of the given day's column"""
+        return self.day_x[day]
+
+    def __repr__(self):
+        return "GridLayout(%s)" % self.canvas
+
+def layout_of(scene):
+    """The GridLayout for the scene's current canvas, it's cached on the
+    scene until the canvas changes.  A GridLayout is passed straight back.
+    """
+    if isinstance(scene, GridLayout):
+        return scene
+    layout = scene.layout
+    if layout is None or layout.canvas is not scene.get_canvas():
+        layout = scene.layout = GridLayout(scene.get_canvas())
+    return layout
 
 def minutes(m, scene):
     """convert from time-based minutes to screen (vert) distance"""
-    bg = scene.get_canvas()
-    return (1.0 * bg.height / timespan) * m
+    return layout_of(scene).minutes(m)
 
 def index_of(item, seq):
     """return index of item (if it exists)"""
@@ -56,11 +106,21 @@ def index_of(item, seq):
         if seq[i] == item:
             return i
 
+def ta_key(name):
+    """what a TA's name is looked up by: names that differ only in case or
+    surrounding blanks are the same TA
+    """
+    return name.strip().lower()
+
 def to_min(time):
     """convert an (hour, minute) tuple to just minutes"""
     h, m = time
     return h*60 + m
 
+def from_min(m):
+    """convert minutes back to an (hour, minute) tuple"""
+    return divmod(m, 60)
+
 def sub_times(t1, t2):
     """subtract t2 from t1, answer in minutes"""
     return to_min(t1) - to_min(t2)
@@ -76,43 +136,179 @@ def inches(x):
     """Converts to inches (72 pts. == 1 in.)"""
     return 72 * x
 
+class PeriodTable:
+    """The start times of the periods in a day, in order.  The last one is
+    the end of the day (it gets no row of its own in the grid).  Minute
+    offsets and the timespan are worked out up front:
+
+    evening = PeriodTable([(17,0), (18,5), (19,10), (20,15), (21,20)])
+    evening.timespan         # 260
+    evening.snap((18,30))    # (18, 5), the period 18:30 falls in
+    """
+    def __init__(self, times):
+        self.times = sorted(tuple(t) for t in times)
+        if len(self.times) < 2:
+            raise ValueError("A PeriodTable needs at least two times")
+        for a, b in zip(self.times, self.times[1:]):
+            if a == b:
+                raise ValueError("%d:%02d is in the PeriodTable twice" % a)
+        self.minutes = [to_min(t) for t in self.times]
+        self.first = self.minutes[0]
+        self.timespan = self.minutes[-1] - self.first
+
+    @classmethod
+    def from_file(cls, filename):
+        """read a table from a file with one H:MM time per line ('#'
+        starts a comment).  A line that isn't a time, or a table that
+        isn't one, is a ValueError saying where.
+        """
+        times = list()
+        with open(filename, 'r') as f:
+            for lineno, line in enumerate(f, 1):
+                line = line.split("#")[0].strip()
+                if not line:
+                    continue
+                m = re.match(r"([0-9]{1,2}):([0-9]{2})$", line)
+                if m is None:
+                    raise ValueError("%s line %d: %r isn't an H:MM time" %
+                                     (filename, lineno, line))
+                times.append((int(m.group(1)), int(m.group(2))))
+        try:
+            return cls(times)
+        except ValueError as e:
+            raise ValueError("%s: %s" % (filename, e))
+
+    def index(self, time):
+        """index of the period that time falls in (-1 if it's before the
+        first one), found by bisection
+        """
+        return bisect_right(self.minutes, to_min(time)) - 1
+
+    def snap(self, time):
+        """the start of the period that time falls in (times before the
+        first period snap to the first one)
+        """
+        return self.times[max(0, self.index(time))]
+
+    def overlaps(self, start, end):
+        """whether any of start-end falls within the day"""
+        return to_min(start) < self.minutes[-1] and to_min(end) > self.first
+
+    def contains(self, start, end):
+        """whether all of start-end falls within the day"""
+        return to_min(start) >= self.first and to_min(end) <= self.minutes[-1]
+
+    def __len__(self):
+        return len(self.times)
+
+    def __iter__(self):
+        return iter(self.times)
+
+    def __eq__(self, other):
+        return self.times == other.times
+
+    def __repr__(self):
+        return "PeriodTable(%s)" % self.times
+
+# the standard day
+default_periods = PeriodTable(start_times)
+timespan = default_periods.timespan
+
+class IntervalList:
+    """A fixed set of (start, end, payload) intervals (in minutes, end not
+    included), sorted by start, with a segment tree over them in that order:
+    each node holds the latest end in its range of intervals.  A query only
+    goes down into the ranges that start before it ends and reach past its
+    start, so finding the k intervals that overlap it takes O((k+1) log n)
+    however long the others are.
+    """
+    def __init__(self, intervals):
+        self.intervals = sorted(intervals, key=lambda i: i[:2])
+        self.starts = [i[0] for i in self.intervals]
+        size = 1
+        while size < len(self.intervals):
+            size *= 2
+        self.size = size
+        # node 1 is the root, node n has children 2n and 2n+1, and the
+        # leaves are size ... size+len-1
+        reach = [float("-inf")] * (2 * size)
+        for i, (start, end, payload) in enumerate(self.intervals):
+            reach[size + i] = end
+        for node in range(size - 1, 0, -1):
+            reach[node] = max(reach[2 * node], reach[2 * node + 1])
+        self.reach = reach
+
+    def __len__(self):
+        return len(self.intervals)
+
+    def __iter__(self):
+        return iter(self.intervals)
+
+    def payloads(self):
+        return [i[2] for i in self.intervals]
+
+    def __scan(self, last, start):
+        """payloads of intervals[:last+1] that end after start (in order)"""
+        out = list()
+        if last < 0:
+            return out
+        reach, size = self.reach, self.size
+        todo = [(1, 0, size)] # (node, first, past the last) left one on top
+        while todo:
+            node, lo, hi = todo.pop()
+            if lo > last or reach[node] <= start:
+                continue
+            if node >= size:
+                out.append(self.intervals[lo][2])
+                continue
+            mid = (lo + hi) // 2
+            todo.append((2 * node + 1, mid, hi))
+            todo.append((2 * node, lo, mid))
+        return out
+
+    def overlapping(self, start, end):
+        """payloads of the intervals that overlap start-end (in minutes)"""
+        return self.__scan(bisect_left(self.starts, end) - 1, start)
+
+    def at(self, t):
+        """payloads of the intervals that contain the minute t"""
+        return self.__scan(bisect_right(self.starts, t) - 1, t)
+
 def y_time(time, scene):
     """calculate the y position within a schedule of the given time"""
-    bg = scene.get_canvas()
-    first_period = to_min(start_times[0])
-    return bg.max_y - minutes(to_min(time) - first_period, scene)
+    return layout_of(scene).y_time(time)
 
 def x_time(day, scene):
-    bg = scene.get_canvas()
-    day_width = bg.width / 6.0
-    # the "_" is for the label column :)
-    return index_of(day, "_MTWRF") * day_width + bg.min_x
+    return layout_of(scene).x_time(day)
 
 def timeslot(sect, scene):
     """Returns a Rectangle positioned at the given day and start time """
-    # get "left" and "right" of the day rectangle
-    day_width = scene.get_canvas().width / 6.0
-    xpos_left = x_time(sect.day, scene)
-    xpos_right = xpos_left + day_width
+    return timeslots([sect], scene)[0]
 
-    # get "top" and "bottom" of the timeslot rectangle
-    ypos_top = y_time(sect.start, scene)
-    ypos_bot = y_time(sect.end, scene)
+def visible(sections, scene):
+    """the sections that fall (at least partly) within the periods of the
+    scene's grid, see timeslots()
+    """
+    periods = layout_of(scene).periods
+    return [sect for sect in sections if periods.overlaps(sect.start, sect.end)]
 
-    return Rectangle(Point(xpos_left, ypos_bot),
-                     Point(xpos_right, ypos_top))
+def timeslots(sections, scene):
+    """Like timeslot(), but for a whole list of Sections at once: returns a
+    list of Rectangles (in the same order).  Sections that run past either
+    end of the grid are cut off at it.
+    """
+    layout = layout_of(scene)
+    y_time = layout.y_time
+    out = list()
+    for sect in sections:
+        # get "left" and "right" of the day rectangle
+        xpos_left = layout.day_x[sect.day]
+        xpos_right = xpos_left + layout.day_width
 
-def timeslot_svg(sect, scene):
-    """Returns a Rectangle positioned at the given day and start time """
-    # get "left" and "right" of the day rectangle
-    day_width = scene.get_canvas().width / 6.0
-    xpos_left = x_time(sect.day, scene)
-    xpos_right = xpos_left + day_width
-
-    bg = scene.get_canvas()
-    # get "top" and "bottom" of the timeslot rectangle
-    ypos_top = y_time(start_times[0], scene) - y_time(sect.start, scene) + bg.min_y
-    ypos_bot = y_time(start_times[0], scene) - y_time(sect.end, scene) + bg.min_y
-
-    return Rectangle(Point(xpos_left, ypos_bot),
-                     Point(xpos_right, ypos_top))
+        # get "top" and "bottom" of the timeslot rectangle
+        ypos_top = min(y_time(sect.start), layout.max_y)
+        ypos_bot = max(y_time(sect.end), layout.min_y)
+
+        out.append(Rectangle(Point(xpos_left, ypos_bot),
+                             Point(xpos_right, ypos_top)))
+    return out
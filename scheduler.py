@@ -1,21 +1,33 @@
 #!/bin/env python3
+import hashlib
+import json
+import os
 import sys
 import time
-from draw import HLine, Point, Rectangle, Scene, Text
-from sched_parser import parse_all, parse_file
-from sched_util import inches, start_times, timeslot, x_time, y_time, \
-                       time_to_str, Section, timeslot_svg
-
-def schedule_grid(title, scene, bounding_box, font_base=12):
-    """Draws a standard Schedule grid:
+from draw import HLine, Point, Rectangle, Scene, Text, PSDocument, \
+                 PDFDocument, Group
+from sched_parser import parse_all, parse_file, ParseCache
+from sched_check import find_conflicts, find_ta_conflicts, find_outside, \
+                        report
+from sched_util import inches, x_time, time_to_str, Section, timeslots, \
+                       visible, GridLayout, PeriodTable, default_periods
+
+def schedule_grid(title, scene, bounding_box, font_base=12, periods=None):
+    """Draws a standard Schedule grid, with a row for each of the periods (a
+    PeriodTable, the standard day if not given)
     """
     margin = 5
 
     # add background (shaded area)
     title_font = font_base + 4
-    o, e = bounding_box.origin, bounding_box.extent
+    o, e = bounding_box.corners() # copies, shrink() moves points in place
     bg = Rectangle(o, e)
     bg = bg.shrink(margin).lower(30).fill(0.8).label_above(title, title_font, 6)
+    # only the title differs from room to room, the rest is a Group
+    heading, bg.label = bg.label, None
+    layout = GridLayout(bg, periods)
+    grid = Group(("grid", bounding_box.width, bounding_box.height, font_base,
+                  tuple(layout.periods.times)), bounding_box.copy())
 
     day_width = bg.width / 6.0
 
@@ -31,33 +43,40 @@ def schedule_grid(title, scene, bounding_box, font_base=12):
     thu = wed.copy().translate((day_width, 0)).label_above("Thursday", fs, adj)
     fri = thu.copy().translate((day_width, 0)).label_above("Friday", fs, adj)
 
-    # add the days to the scene
-    scene.add(bg, True) # make this the working canvas
-    scene.add(mon)
-    scene.add(tue)
-    scene.add(wed)
-    scene.add(thu)
-    scene.add(fri)
+    # add the days to the grid
+    grid.add(bg)
+    grid.add(mon)
+    grid.add(tue)
+    grid.add(wed)
+    grid.add(thu)
+    grid.add(fri)
 
     # fill in time labels (and draw horiz lines)
     linespacing = int(-1.0 * fs / 1.5)
-    for t in start_times[:-1]:
-        ypos = y_time(t, scene)
+    for t in layout.periods.times[:-1]:
+        ypos = layout.y_time(t)
         h = HLine(Point(bg.min_x, ypos), bg.width)
         h.label_below_left(time_to_str(t), fs, 5, linespacing)
-        scene.add(h)
+        grid.add(h)
 
+    scene.add(grid)
+    scene.add(heading)
+    scene.canvas = bg # the working canvas
+    scene.layout = layout
     return scene
 
 def add_sections(section_data, scene, bounding_box, font_base=12):
-    """iterate over the list of Section objects, add each to the scene"""
+    """iterate over the list of Section objects, add each to the scene.
+    Sections outside the grid's periods are left out, and ones that run
+    past it are cut off (see sched_check.find_outside to report them).
+    """
+    section_data = visible(section_data, scene)
     if not section_data:
         return scene
 
     v_tweak = -1.0 * font_base / 6
     h_tweak = font_base / 2
-    for sect in section_data:
-        r = timeslot(sect, scene)
+    for sect, r in zip(section_data, timeslots(section_data, scene)):
         lines = [str(sect.num), sect.ta, 
                  time_to_str(sect.start) + " -- " + time_to_str(sect.end)]
         r.label_inside_multi(lines, font_base-2, h_tweak, v_tweak).fill(1.0)
@@ -65,59 +84,74 @@ def add_sections(section_data, scene, bounding_box, font_base=12):
 
     return scene
 
-def add_sections_svg(section_data, scene, bounding_box, font_base=12):
-    if not section_data:
-        return scene
-
-    v_tweak = font_base / 5
-    h_tweak = font_base / 2
-    for sect in section_data:
-        r = timeslot_svg(sect, scene)
-        lines = [str(sect.num), sect.ta, 
-                 str(time_to_str(sect.start),"utf8") + str("\u2013","utf8") + str(time_to_str(sect.end),"utf8")]
-        r.label_inside_multi_svg(lines, font_base, h_tweak, v_tweak).fill(1.0)
-        scene.add(r)
-
-    return scene
-
-def add_section_svg(sect, scene, bounding_box, font_base=12):
-    if not sect:
-        return scene
-
-    v_tweak = font_base / 5
-    h_tweak = font_base / 2
-    r = timeslot_svg(sect, scene)
-    lines = [str(sect.num), sect.ta, 
-             time_to_str(sect.start) + "\u2013" + time_to_str(sect.end)]
-    r.label_inside_multi_svg(lines, font_base, h_tweak, v_tweak).fill(1.0)
-    scene.add(r)
-
-    return scene
-
-def schedule(lab_label="Testing", 
-             section_data=list(), 
-             outfile=sys.stdout,
-             bounding_box=Rectangle(Point(0,0), Point(inches(8.5), inches(4)))):
+def placard_scene(lab_label="Testing",
+                 section_data=list(),
+                 bounding_box=Rectangle(Point(0,0), Point(inches(8.5), inches(4))),
+                 periods=None):
+    """the Scene for one room's placard"""
     # schedules are on half-sheets
     s = Scene(bounding_box)
 
     # draw the scheduling grid
-    s = schedule_grid(lab_label, s, bounding_box)
+    s = schedule_grid(lab_label, s, bounding_box, periods=periods)
 
     # add sections to schedule
     s = add_sections(section_data, s, bounding_box)
+    return s
+
+def schedule(lab_label="Testing", 
+             section_data=list(), 
+             outfile=sys.stdout,
+             bounding_box=Rectangle(Point(0,0), Point(inches(8.5), inches(4))),
+             periods=None,
+             backend="ps"):
+    s = placard_scene(lab_label, section_data, bounding_box, periods)
 
     # render the result
-    if format == "SVG":
-        s.render_svg(outfile)
-    else:
-        s.render(outfile)
+    s.render(outfile, backend)
 
-def summary(lab_data,
-            bounding_box=Rectangle(Point(0,0), Point(inches(8.5), inches(11))),
-            format="PS"):
+def schedule_svg(lab_label="Testing",
+                 section_data=list(),
+                 outfile=sys.stdout,
+                 bounding_box=Rectangle(Point(0,0), Point(inches(8.5), inches(4))),
+                 periods=None):
+    """the same placard as schedule(), in SVG"""
+    schedule(lab_label, section_data, outfile, bounding_box, periods, "svg")
+
+def formats_of(format):
+    """format ("PS", "SVG") or a list of them, as a list"""
+    if isinstance(format, str):
+        return [format]
+    return list(format)
+
+def write_scene(scene, outputs):
+    """write one scene to each of outputs, [(format, filename), ...].  The
+    layout is only done once, however many formats it goes out in.
+    Returns the filenames.
+    """
+    for format, outname in outputs:
+        with open(outname, "w") as outfile:
+            scene.render(outfile, format.lower())
+    return [outname for format, outname in outputs]
+
+def session_label(when=None):
+    """name of the current session, like 'Fall 2011'"""
+    t = time.localtime(when)
+    mon = t.tm_mon
+    yr = t.tm_year
+    if mon in [12, 1, 2, 3, 4]:
+        session = "Spring"
+    elif mon in [8, 9, 10, 11]:
+        session = "Fall"
+    else:
+        session = "Summer"
+    return "%s %d" % (session, yr)
 
-    bounding_box = bounding_box.translate((8, -36))
+def summary_scene(lab_data,
+                  bounding_box=Rectangle(Point(0,0), Point(inches(8.5), inches(11))),
+                  periods=None):
+    """the Scene for the summary page (the first nine rooms)"""
+    bounding_box = bounding_box.copy().translate((8, -36))
     s = Scene(bounding_box)
 
     # draw reduced-size schedules (2.5 x 2.5)
@@ -139,113 +173,202 @@ def summary(lab_data,
         course_num, room_num = course_key
         section_data = lab_data[course_key]
 
-        s = schedule_grid("Physics %d | %d" % (course_num, room_num), s, bb, 8)
+        s = schedule_grid("Physics %d | %d" % (course_num, room_num), s, bb, 8,
+                          periods)
         s = add_sections(section_data, s, bb, 8)
 
     # label the summary
-    t = time.localtime(time.time())
-    mon = t.tm_mon
-    yr = t.tm_year
-    if mon in [12, 1, 2, 3, 4]:
-        session = "Spring"
-    elif mon in [8, 9, 10, 11]:
-        session = "Fall"
-    else:
-        session = "Summer"
-    label = "%s %d" % (session, yr)
+    label = session_label()
     s.add(Text(Point(inches(8.5)/2.0, inches(11) - inches(0.50)), 
                label, True, "Helvetica", 36))
-    
-    with open("summary.ps", "w") as outfile:
-        s.render(outfile)
+    return s
 
-def schedule_grid_svg(title, scene, bounding_box, font_base=12):
-    """Draws standard schedule grid, SVG
+def summary(lab_data,
+            bounding_box=Rectangle(Point(0,0), Point(inches(8.5), inches(11))),
+            format="PS",
+            periods=None):
+    """write summary.ps (or .svg, or both if format is a list of them)"""
+    s = summary_scene(lab_data, bounding_box, periods)
+    return write_scene(s, [(f, "summary.%s" % f.lower())
+                           for f in formats_of(format)])
+
+def combined(lab_data, outfile, periods=None, document=PSDocument):
+    """Write every room's placard, two half-sheets to a page, then the
+    summary, as one multi-page PostScript (or, with document=PDFDocument,
+    PDF) document.  Each page is built, written and thrown away before
+    the next, however many rooms there are.  Returns the number of pages.
     """
-    margin = 5
-    
-    # add background (shaded area)
-    title_font = font_base + 4
-    o, e = bounding_box.origin, bounding_box.extent
-    bg = Rectangle(o, e)
-    bg = bg.shrink(margin).lower_svg(40).fill(0.8).label_above_svg(title, title_font, 12)
-
-    day_width = bg.width / 6.0
-
-    # label column on left
-    lab = Rectangle(bg.origin.copy(), Point(bg.min_x + day_width, bg.max_y))
-
-    # add days
-    adj = -2 # move labels slightly down
-    fs = font_base - 2
-    mon = lab.copy().fill(0.8).translate((day_width, 0)).label_above_svg("Monday", fs, adj)
-    tue = mon.copy().fill(0.8).translate((day_width, 0)).label_above_svg("Tuesday", fs, adj)
-    wed = tue.copy().fill(0.8).translate((day_width, 0)).label_above_svg("Wednesday", fs, adj)
-    thu = wed.copy().fill(0.8).translate((day_width, 0)).label_above_svg("Thursday", fs, adj)
-    fri = thu.copy().fill(0.8).translate((day_width, 0)).label_above_svg("Friday", fs, adj)
-
-    # add the days to the scene
-    scene.add(bg, True) # make this the working canvas
-    scene.add(mon)
-    scene.add(tue)
-    scene.add(wed)
-    scene.add(thu)
-    scene.add(fri)
-
-    # fill in time labels (and draw horiz lines)
-    linespacing = int(-1.0 * fs / 0.8)
-    for t in reversed(start_times[:-1]):
-        ypos = bg.max_y - y_time(t, scene) + bg.min_y
-        h = HLine(Point(bg.min_x, ypos), bg.width)
-        h.label_below_left_svg(time_to_str(t), fs, 5, -linespacing)
-        scene.add(h)
-
-    return scene
-
-def schedule_svg(lab_label="Testing",
-                 section_data=list(),
-                 outfile=sys.stdout,
-                 bounding_box=Rectangle(Point(0,0), Point(850, 400))):
-
-    # schedules are on half-sheets
-    s = Scene(bounding_box)
-
-    # draw the scheduling grid
-    s = schedule_grid_svg(lab_label, s, bounding_box)
-
-    # add sections to schedule
-    s = add_sections_svg(section_data, s, bounding_box)
-
-    # render the result
-    s.render_svg(outfile)
-
-def summary_svg(data):
-    pass
-    
-def main(format="PS"):
-    # read in all .txt files
-    data = parse_all()
-
-    # each dictionary key is one room label (write to a separate file)
+    doc = document(outfile)
+    half = doc.height / 2.0
+    keys = list(lab_data)
+    for i in range(0, len(keys), 2):
+        placed = list()
+        for n, (course_num, room_num) in enumerate(keys[i:i+2]):
+            s = placard_scene("Physics %d | %d" % (course_num, room_num),
+                              lab_data[(course_num, room_num)],
+                              periods=periods)
+            # top half, then bottom, centered in it
+            dy = half * (1 - n) + (half - s.bounds.height) / 2.0
+            placed.append((s, (0, dy)))
+        doc.page(placed)
+    doc.page([(summary_scene(lab_data, periods=periods), (0, 0))])
+    doc.close()
+    return doc.pages
+
+# bump this whenever a change to the drawing code changes the output, so
+# that incremental builds don't keep stale placards around
+RENDERER_VERSION = 7
+
+# where incremental builds remember what they rendered last time
+MANIFEST = ".sched_build"
+
+def fingerprint(*inputs):
+    """hash of everything that goes into one output file"""
+    h = hashlib.sha1(repr((RENDERER_VERSION,) + inputs).encode("utf8"))
+    return h.hexdigest()
+
+def load_manifest(path=MANIFEST):
+    """{output filename: fingerprint} from the last build (if any)"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return dict()
+
+def save_manifest(manifest, path=MANIFEST):
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+def render_placard(job):
+    """Render one room's placard to its file(s), job is a tuple of
+    (title, section_data, outputs, periods), outputs as for write_scene().
+    This is what the worker processes run for main(jobs=N).
+    """
+    title, section_data, outputs, periods = job
+    return write_scene(placard_scene(title, section_data, periods=periods),
+                       outputs)
+
+def main(format="PS", incremental=False, jobs=1, periods=None, check=True,
+         merged=None, combined_doc=False):
+    """Render a placard for every room and a summary.  With incremental,
+    outputs whose inputs haven't changed since the last build are left
+    alone.  With jobs > 1, files are parsed and placards rendered in that
+    many processes.  periods is a PeriodTable (the standard day if not
+    given).  With check, overlapping sections (in one room, or for one
+    TA), and sections that don't fit in the periods, are reported on
+    stderr before rendering.  merged names a single
+    file holding every room (see sched_parser) to read instead of the
+    .txt files.  With combined_doc, everything goes into one PostScript
+    file, 'schedule.ps' (see combined()), instead.  format "PDF" always
+    works that way, into 'schedule.pdf'.  Otherwise format is "PS",
+    "SVG" or a list of both, each placard is laid out once and written in
+    every format asked for.  Returns the list of files (re)written.
+    """
+    if periods is None:
+        periods = default_periods
+    # read in all .txt files (unchanged ones come out of the cache)
+    cache = ParseCache()
+    data = parse_all(workers=jobs, cache=cache, merged=merged)
+    cache.save()
+
+    if check:
+        report(find_conflicts(data), "Room conflicts")
+        report(find_ta_conflicts(data), "TA double-bookings")
+        report(find_outside(data, periods), "Sections outside the periods")
+
+    old = load_manifest() if incremental else dict()
+    new = dict()
+    todo = list()
+
+    if combined_doc or format == "PDF":
+        if format == "PDF":
+            docname, mode, document = "schedule.pdf", "wb", PDFDocument
+        else:
+            docname, mode, document = "schedule.ps", "w", PSDocument
+        new[docname] = fingerprint("combined", docname, session_label(),
+                                   sorted(data.items()), periods.times)
+        written = list()
+        if old.get(docname) != new[docname] or not os.path.exists(docname):
+            with open(docname, mode) as outfile:
+                combined(data, outfile, periods, document)
+            written.append(docname)
+        save_manifest(new)
+        return written
+
+    # each dictionary key is one room label (write to separate files)
+    formats = formats_of(format)
     for course_key in data:
         course_num, room_num = course_key
         section_data = data[course_key]
-        course_num, room_num = course_key
-
-        # render the collected information to file
-        if format == "SVG":
-            with open("%d_%d.svg" % (course_num, room_num), "w") as outfile:
-                schedule_svg("Physics %d | %d" % (course_num, room_num), 
-                             section_data, outfile)
-        else: # PS default
-            with open("%d_%d.ps" % (course_num, room_num), "w") as outfile:
-                schedule("Physics %d | %d" % (course_num, room_num), 
-                         section_data, outfile)
-    # generate summary
-    if format == "SVG":
-        summary_svg(data)
+        title = "Physics %d | %d" % (course_num, room_num)
+        outputs = list()
+        for f in formats:
+            outname = "%d_%d.%s" % (course_num, room_num, f.lower())
+            new[outname] = fingerprint(f, title, section_data, periods.times)
+            if old.get(outname) != new[outname] or not os.path.exists(outname):
+                outputs.append((f, outname))
+        if outputs:
+            todo.append((title, section_data, outputs, periods))
+
+    # render the collected information to file
+    if jobs > 1 and len(todo) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            done = list(pool.map(render_placard, todo))
     else:
-        summary(data)
+        done = list(map(render_placard, todo))
+    written = [outname for outnames in done for outname in outnames]
+
+    # generate summary (only if some placard, or the session, changed)
+    placards = sorted(new.items())
+    outputs = list()
+    for f in formats:
+        sumname = "summary.%s" % f.lower()
+        new[sumname] = fingerprint(f, session_label(), placards)
+        if old.get(sumname) != new[sumname] or not os.path.exists(sumname):
+            outputs.append((f, sumname))
+    if outputs:
+        written.extend(write_scene(summary_scene(data, periods=periods),
+                                   outputs))
+
+    save_manifest(new)
+    return written
 
 if __name__ == "__main__":
-    main(format="SVG")
+    import argparse
+    parser = argparse.ArgumentParser(description="Render lab schedule placards")
+    parser.add_argument("--ps", dest="format", action="store_const",
+                        const="PS", default="SVG",
+                        help="write PostScript instead of SVG")
+    parser.add_argument("--both", dest="format", action="store_const",
+                        const=("PS", "SVG"),
+                        help="write PostScript and SVG")
+    parser.add_argument("--pdf", dest="format", action="store_const",
+                        const="PDF",
+                        help="write every placard and the summary into one "
+                             "PDF, schedule.pdf")
+    parser.add_argument("-i", "--incremental", action="store_true",
+                        help="only re-render placards whose sections changed")
+    parser.add_argument("-j", "--jobs", type=int, default=1, metavar="N",
+                        help="render placards in N processes")
+    parser.add_argument("-p", "--periods", metavar="FILE",
+                        help="read the period start times (one H:MM per "
+                             "line) from FILE instead of the standard day")
+    parser.add_argument("--no-check", dest="check", action="store_false",
+                        help="don't report overlapping sections")
+    parser.add_argument("-c", "--combined", action="store_true",
+                        help="write every placard (two to a page) and the "
+                             "summary into one PostScript file, schedule.ps")
+    parser.add_argument("-m", "--merged", metavar="FILE",
+                        help="read every room from FILE ([course room] "
+                             "blocks) instead of the .txt files")
+    args = parser.parse_args()
+    periods = None
+    if args.periods:
+        try:
+            periods = PeriodTable.from_file(args.periods)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+    main(format=args.format, incremental=args.incremental, jobs=args.jobs,
+         periods=periods, check=args.check, merged=args.merged,
+         combined_doc=args.combined)
@@ -1,8 +1,25 @@
 #!/bin/env python3
-from draw import Point, Scene, Rectangle, HLine, Text
-from sched_parser import parse_line, parse_all_lines, parse_file, parse_all
+from draw import Point, Scene, Rectangle, HLine, Text, RectBatch, PSDocument, \
+                 PDFDocument, Group
+from draw_prim import Emitter, num, text_width, pdf_string, PSBackend, \
+                      PDFBackend, Backend, get_backend, register_backend, \
+                      backends, emit
+from sched_parser import parse_line, parse_all_lines, parse_file, parse_all, \
+                         SectionGrammar, get_grammar, fast_parse_line, \
+                         iter_sections, ParseCache, parse_merged, \
+                         parse_room, room_index, load_index, write_merged, \
+                         format_section, scan_index
 from sched_util import *
+import scheduler
+from sched_check import overlapping, find_conflicts, Conflict, \
+                        TAIndex, find_ta_conflicts, find_outside, Outside
+from sched_query import ScheduleIndex, FreeSlots, section_number
+import sched_query
 import unittest
+import sys
+import io
+import re
+import zlib
 import os
 import tempfile
 
@@ -57,6 +74,173 @@ class TestScene(unittest.TestCase):
         self.s.add(r)
         self.assertEqual(self.s.render(self.null), None)
 
+    def testRenderSingleWrite(self):
+        class CountingFile:
+            def __init__(self):
+                self.writes = list()
+            def write(self, txt):
+                self.writes.append(txt)
+        self.s.add(Rectangle(Point(5,5), Point(8,8)).label_above("a"))
+        self.s.add(Rectangle(Point(1,1), Point(2,2)).fill(0.5))
+        for render in (self.s.render, self.s.render_svg):
+            f = CountingFile()
+            render(f)
+            self.assertEqual(len(f.writes), 1)
+        self.assertEqual(self.s.render_svg(self.null), f.writes[0])
+
+    def testToBytes(self):
+        self.s.add(Rectangle(Point(5,5), Point(8,8)).label_above("a"))
+        ps, svg = io.StringIO(), io.StringIO()
+        self.s.render(ps)
+        self.s.render_svg(svg)
+        self.assertEqual(self.s.to_ps_bytes(), ps.getvalue().encode("utf8"))
+        self.assertEqual(self.s.to_svg_bytes(), svg.getvalue().encode("utf8"))
+        self.assertTrue(self.s.to_svg_bytes().startswith(b"<svg "))
+
+    def testPreambleFonts(self):
+        self.s.add(Rectangle(Point(5,5), Point(8,8)).label_above("a", 9))
+        ps = self.s.to_ps_bytes().decode("utf8")
+        self.assertIn("\n/f0 /Helvetica findfont 9 scalefont def\n", ps)
+        self.assertLess(ps.index("/f0 /Helvetica"), ps.index("f0 setfont"))
+        self.assertEqual(ps.count(" setfont\n"), 1)
+
+    def testDocument(self):
+        self.s.add(Rectangle(Point(5,5), Point(8,8)).label_above("a", 9))
+        f = io.StringIO()
+        doc = PSDocument(f)
+        doc.page([(self.s, (0, 400)), (self.s, (0, 0))])
+        self.assertTrue(f.getvalue().endswith("showpage\n")) # written already
+        doc.page([(self.s, (1.5, 0))])
+        doc.close()
+        ps = f.getvalue()
+        self.assertIn("%%Pages: (atend)", ps)
+        self.assertEqual(ps.count("%%Page: "), 2)
+        self.assertTrue(ps.endswith("%%Trailer\n%%Pages: 2\n%%EOF\n"))
+        self.assertIn("\ngsave 1.5 0 translate\n", ps)
+        # each page sets up its own fonts, and sets one after each grestore
+        self.assertEqual(ps.count("/f0 /Helvetica findfont 9 scalefont def"), 2)
+        self.assertEqual(ps.count("\nf0 setfont\n"), 3)
+        self.assertEqual(ps.count(" save def"), ps.count("pagesave restore"))
+
+    def testPDFDocument(self):
+        grid = Group("grid", Rectangle(Point(0,0), Point(4,4)))
+        grid.add(Rectangle(Point(1,1), Point(3,3)).fill(0.5))
+        self.s.add(grid)
+        self.s.add(Text(Point(5,5), "a(b)", size=9))
+        f = io.BytesIO()
+        doc = PDFDocument(f)
+        doc.page([(self.s, (0, 0)), (self.s, (10, 20))])
+        doc.page([(self.s, (0, 0))])
+        doc.close()
+        pdf = f.getvalue()
+        self.assertTrue(pdf.startswith(b"%PDF-1.5\n"))
+        self.assertTrue(pdf.endswith(b"%%EOF\n"))
+        # the grid is drawn once
+        self.assertEqual(pdf.count(b"/Subtype /Form"), 1)
+        # the cross-reference stream is where startxref says
+        start = int(pdf.split(b"startxref\n")[1].split()[0])
+        self.assertIn(b"/Type /XRef", pdf[start:start+100])
+        streams = [zlib.decompress(s) for s in
+                   re.findall(b">>\nstream\n(.*?)\nendstream", pdf, re.S)]
+        form, page1 = streams[0], streams[1]
+        self.assertEqual(form, b"0.5 g\n1 1 2 2 re B\n")
+        self.assertEqual(page1.count(b"/G0 Do"), 2)
+        self.assertIn(b"q 1 0 0 1 10 20 cm\n", page1)
+        self.assertIn(b"BT -3 5 Td (a\\(b\\)) Tj ET", page1) # centered
+        objects = streams[-2] # the object stream
+        self.assertEqual(objects.count(b"/Type /Page "), 2)
+        self.assertEqual(objects.count(b"/Type /Font"), 1)
+        self.assertIn(b"/Encoding /WinAnsiEncoding", objects)
+        self.assertIn(b"/XObject << /G0 ", objects)
+
+    def testPDFState(self):
+        pdf = PDFBackend(Emitter())
+        Rectangle(Point(0,0), Point(10,10)).fill(0.8).draw(pdf)
+        Rectangle(Point(0,0), Point(5,5)).fill(0.8).draw(pdf)
+        Text(Point(0,0), ["x", "y", "z"], False).draw(pdf)
+        HLine(Point(1,2), 3).draw(pdf)
+        self.assertEqual(pdf.out.lines, ["0.8 g", "0 0 10 10 re B", "0 0 5 5 re B",
+                                         "0 g", "/Helvetica 12 Tf",
+                                         "BT 0 -12 Td (x) Tj ET",
+                                         "/Helvetica 10 Tf",
+                                         "BT 0 -22 Td (y) Tj ET",
+                                         "BT 0 -32 Td (z) Tj ET",
+                                         "1 2 m 4 2 l S"])
+        self.assertEqual(pdf.fonts, set(["Helvetica"]))
+        self.assertAlmostEqual(text_width("Monday", 10), 35.57)
+        self.assertEqual(pdf_string("\\"), "(\\\\)")
+        # one WinAnsiEncoding byte per character
+        self.assertEqual(pdf_string("O'Neil \u00e9\u2013").encode("latin-1"),
+                         b"(O'Neil \xe9\x96)")
+
+    def testSinglePagePDF(self):
+        self.s.add(Rectangle(Point(5,5), Point(8,8)).label_above("a"))
+        pdf = self.s.to_bytes("pdf")
+        self.assertTrue(pdf.startswith(b"%PDF-1.5"))
+        self.assertTrue(pdf.endswith(b"%%EOF\n"))
+        f = io.BytesIO()
+        self.assertEqual(self.s.document(f, "pdf"), f.getvalue())
+        self.assertEqual(f.getvalue(), pdf)
+
+    def testBackendReused(self):
+        # one backend, two documents: each is complete on its own
+        self.s.add(Rectangle(Point(5,5), Point(8,8)).fill(0.5).label_above("a"))
+        for name in ("ps", "svg", "pdf"):
+            cls = get_backend(name)
+            backend = cls(io.BytesIO() if cls.binary else io.StringIO())
+            docs = list()
+            for i in range(2):
+                backend.begin_document(self.s.bounds)
+                self.s.draw(backend)
+                docs.append(backend.end_document())
+            if not cls.binary:
+                docs = [doc.encode("utf8") for doc in docs]
+            self.assertEqual(docs, [self.s.to_bytes(name)] * 2, name)
+            if name == "ps":
+                self.assertIn(b"\nf0 setfont\n", docs[1])
+
+    def testDocumentToEmitter(self):
+        # an Emitter stands in for a file, whole documents too
+        self.s.add(Rectangle(Point(5,5), Point(8,8)).label_above("a"))
+        for backend in ("ps", "svg"):
+            out = Emitter()
+            self.s.render(out, backend)
+            self.assertEqual(out.getvalue(),
+                             self.s.to_bytes(backend).decode("utf8"))
+        out = Emitter()
+        ps = PSBackend(out)
+        ps.begin_document(self.s.bounds)
+        ps.rect(1, 1, 2, 2)
+        doc = ps.end_document()
+        self.assertEqual(out.getvalue(), doc)
+
+    def testBackends(self):
+        class Counting(Backend):
+            """counts what's drawn, and draws it as text"""
+            def finish(self, lines):
+                return "%d things\n" % len(lines)
+            def rect(self, x1, y1, x2, y2, fill=False, color=1.0):
+                return emit(["rect"], self.out)
+            def text(self, x, y, txt, font="Helvetica", size=12, center=True):
+                return emit(["text " + txt], self.out)
+        self.assertIs(get_backend("ps"), PSBackend)
+        self.assertRaises(ValueError, get_backend, "nope")
+        register_backend("count", Counting)
+        try:
+            self.s.add(Rectangle(Point(5,5), Point(8,8)).label_above("a"))
+            self.s.add(HLine(Point(1,1), 2))
+            self.s.add(Text(Point(1,1), ["b", "c"]))
+            f = io.StringIO()
+            self.s.render(f, backend="count")
+            self.assertEqual(f.getvalue(), "5 things\n")
+            self.assertEqual(self.s.to_bytes("count"), b"5 things\n")
+        finally:
+            del backends["count"]
+
+    def testNum(self):
+        self.assertEqual([num(x) for x in (10.0, 5.5, 1/3.0, -0.001, 2)],
+                         ["10", "5.5", "0.33", "0", "2"])
+
 
 class TestRectangle(unittest.TestCase):
     def setUp(self):
@@ -145,44 +329,20 @@ class TestRectangle(unittest.TestCase):
     def testFill(self):
         self.r.fill(0.5)
         self.assertEqual(self.r.render(self.null),
-                         ['% BOX at (0, 0) 10.000000 by 10.000000',
-                          '0.000000 0.000000 moveto',
-                          '10.000000 0 rlineto',
-                          '0 10.000000 rlineto',
-                          '-10.000000 0 rlineto',
-                          '0 -10.000000 rlineto',
-                          'gsave closepath',
-                          '0.50 setgray',
-                          'fill',
-                          '0 setgray grestore',
-                          'closepath stroke'])
+                         ['0 0 10 10 0.5 F'])
 
 
     def testRender(self):
         self.assertEqual(self.r.render(self.null), 
-                         ['% BOX at (0, 0) 10.000000 by 10.000000', 
-                          '0.000000 0.000000 moveto', 
-                          '10.000000 0 rlineto', 
-                          '0 10.000000 rlineto', 
-                          '-10.000000 0 rlineto', 
-                          '0 -10.000000 rlineto', 
-                          'closepath stroke'])
+                         ['0 0 10 10 B'])
 
     def testLabelRender(self):
         self.r.label_above("testing")
         self.assertIsNotNone(self.r.label)
         self.assertEqual(self.r.render(self.null),
-                         ['% BOX at (0, 0) 10.000000 by 10.000000', 
-                          '0.000000 0.000000 moveto',
-                          '10.000000 0 rlineto',
-                          '0 10.000000 rlineto',
-                          '-10.000000 0 rlineto',
-                          '0 -10.000000 rlineto',
-                          'closepath stroke',
-                          '% LABEL at (5, 16) (testing)',
-                          '5.000000 16.000000 moveto',
-                          '/Helvetica findfont 12.000000 scalefont setfont',
-                          '(testing) dup stringwidth pop 2 div neg 0 rmoveto show'])
+                         ['0 0 10 10 B',
+                          '/Helvetica 12 SF',
+                          '5 16 (testing) C'])
 
     def testRepr(self):
         self.assertEqual("%s" % self.r, "Rectangle((0, 0), (10, 10))")
@@ -201,13 +361,50 @@ class TestHLine(unittest.TestCase):
 
     def testRender(self):
         self.assertEqual(self.h.render(self.null),
-                         ['% BOX at (0, 0) 5.000000 by 0.000000', 
-                          '0.000000 0.000000 moveto', 
-                          '5.000000 0 rlineto',
-                          '0 0.000000 rlineto',
-                          '-5.000000 0 rlineto',
-                          '0 -0.000000 rlineto',
-                          'closepath stroke'])
+                         ['0 0 5 0 B'])
+
+
+class TestRectBatch(unittest.TestCase):
+    def setUp(self):
+        self.null = open(os.devnull, "w")
+        self.rects = [Rectangle(Point(0,0), Point(10,10)).fill(0.5),
+                      Rectangle(Point(2,3), Point(4,8)).label_above("x"),
+                      Rectangle(Point(1,1), Point(9,4))]
+        self.b = RectBatch(self.rects)
+
+    def testGetItem(self):
+        self.assertEqual(len(self.b), 3)
+        r = self.b[1]
+        self.assertEqual((r.origin, r.extent), (Point(2,3), Point(4,8)))
+        self.assertIs(r.label, self.rects[1].label)
+        self.assertTrue(self.b[0].filled)
+
+    def testTranslateShrink(self):
+        self.b.translate((2, 3)).shrink(1)
+        self.assertEqual((self.b[0].origin, self.b[0].extent),
+                         (Point(3,4), Point(11,12)))
+        self.assertRaises(ValueError, self.b.shrink, 1)
+
+    def testContainedIn(self):
+        self.assertTrue(self.b.contained_in(Rectangle(Point(0,0), Point(10,10))))
+        self.assertFalse(self.b.contained_in(Rectangle(Point(1,0), Point(10,10))))
+        self.assertTrue(RectBatch().contained_in(Rectangle(Point(0,0), Point(1,1))))
+
+    def testRenderLikeRectangles(self):
+        expected = list()
+        for r in self.rects:
+            expected.extend(r.render(self.null))
+        self.assertEqual(self.b.render(self.null), expected)
+        expected = list()
+        for r in self.rects:
+            expected.extend(r.render_svg(self.null))
+        self.assertEqual(self.b.render_svg(self.null), expected)
+
+    def testInScene(self):
+        s = Scene(Rectangle(Point(0,0), Point(20,20)))
+        s.add(Rectangle(Point(0,0), Point(20,20)))
+        s.add(self.b)
+        self.assertIn(b"\n2 3 2 5 B\n", s.to_ps_bytes())
 
 
 class TestText(unittest.TestCase):
@@ -223,32 +420,34 @@ class TestText(unittest.TestCase):
 
     def testRender(self):
         self.assertEqual(self.t.render(self.null), 
-                         ['% LABEL at (0, 0) (testing)', 
-                          '0.000000 0.000000 moveto', 
-                          '/Helvetica findfont 12.000000 scalefont setfont', 
-                          '(testing) dup stringwidth pop 2 div neg 0 rmoveto show'])
+                         ['/Helvetica 12 SF', '0 0 (testing) C'])
 
     def testRenderMultiline(self):
         self.assertEqual(self.tm.render(self.null),
-                         ['% LABEL at (0, -12) (Multi)',
-                          '0.000000 -12.000000 moveto',
-                          '/Helvetica findfont 12.000000 scalefont setfont',
-                          '(Multi) dup stringwidth pop 2 div neg 0 rmoveto show',
-                          '% LABEL at (0, -22) (Line)',
-                          '0.000000 -22.000000 moveto',
-                          '/Helvetica findfont 10.000000 scalefont setfont',
-                          '(Line) dup stringwidth pop 2 div neg 0 rmoveto show',
-                          '% LABEL at (0, -32) (Text)',
-                          '0.000000 -32.000000 moveto',
-                          '/Helvetica findfont 10.000000 scalefont setfont',
-                          '(Text) dup stringwidth pop 2 div neg 0 rmoveto show'])
+                         ['/Helvetica 12 SF',
+                          '0 -12 (Multi) C',
+                          '/Helvetica 10 SF',
+                          '0 -22 (Line) C',
+                          '0 -32 (Text) C'])
+
+    def testFontState(self):
+        ps = PSBackend(Emitter(), font_dicts=True)
+        self.tm.draw(ps)
+        self.t.draw(ps)
+        self.assertEqual(ps.out.lines,
+                         ['f0 setfont',
+                          '0 -12 (Multi) C',
+                          'f1 setfont',
+                          '0 -22 (Line) C',
+                          '0 -32 (Text) C',
+                          'f0 setfont',
+                          '0 0 (testing) C'])
+        self.assertEqual(ps.fonts, {("Helvetica", 12): "f0",
+                                     ("Helvetica", 10): "f1"})
 
     def testOffCenter(self):
         self.assertEqual(self.toffc.render(self.null),
-                        ['% LABEL at (0, 0) (testing)',
-                         '0.000000 0.000000 moveto',
-                         '/Helvetica findfont 12.000000 scalefont setfont', 
-                         '(testing) show'])
+                        ['/Helvetica 12 SF', '0 0 (testing) L'])
 
     def testRepr(self):
         self.assertEqual("%s" % self.t, "Text(testing)")
@@ -310,6 +509,16 @@ F,16:00 c 17:00
         p = parse_all_lines(self.sampleText1)
         self.assertEqual(p, self.sampleParse1)
 
+    def testIterSections(self):
+        with open(self.fname) as f:
+            it = iter_sections(f)
+            first = next(it)
+            self.assertEqual(first, self.sampleParse1[0])
+            self.assertEqual(first.lineno, 2)
+            rest = list(it)
+        self.assertEqual([first] + rest, self.sampleParse1)
+        self.assertEqual([s.lineno for s in rest], [3, 4, 5, 8, 9, 10])
+
     def testParseFile(self):
         p = parse_file(self.fname)
         self.assertEqual(p, ((103, 4320), self.sampleParse1))
@@ -320,6 +529,187 @@ F,16:00 c 17:00
         p = parse_all()
         self.assertEqual(p, { (103, 4320): self.sampleParse1 })
 
+    def testParseAllWorkers(self):
+        with open("321_2223.txt", 'w') as f:
+            print(self.sampleText2, file=f)
+        try:
+            serial = parse_all()
+            parallel = parse_all(workers=2)
+        finally:
+            os.unlink("321_2223.txt")
+        self.assertEqual(parallel, serial)
+        self.assertEqual(list(parallel), [(103, 4320), (321, 2223)])
+
+    def testGrammarShared(self):
+        self.assertIs(get_grammar(), get_grammar())
+        self.assertIsInstance(get_grammar(), SectionGrammar)
+
+    def testGrammarParseLines(self):
+        g = SectionGrammar()
+        p = g.parse_lines(self.sampleText1.split("\n"))
+        self.assertEqual(p, self.sampleParse1)
+        self.assertEqual(g.parse_line(self.sampleLine2), self.s2)
+
+    def testFastPathMatchesGrammar(self):
+        # whenever the fast path answers, it must agree with pyparsing
+        lines = (self.sampleText1 + self.sampleText2 + self.sampleText3).split("\n")
+        lines += ["M,12:05 301 Van Dyke 14:00", "W,9:55 310 O'Neil\t11:50",
+                  "R,7:45 311 N/A 9:40 trailing", "T,7:45xx9:40:",
+                  "T,14:25 (321) 301 Dhorkah 17:25", "M , 12:05 301 Ojalvo 14:00",
+                  "M,\u0661\u0662:05 301 Ojalvo 14:00"]
+        g = get_grammar()
+        fast = 0
+        for line in lines:
+            try:
+                expected = g.parse_line(line)
+            except Exception:
+                expected = None
+            got = fast_parse_line(line)
+            if got is not None:
+                fast += 1
+                self.assertEqual(got, expected)
+            self.assertEqual(parse_line(line) if expected else None, expected)
+        self.assertTrue(fast >= 12)
+
+
+class TestParseCache(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.cachefile = os.path.join(self.dir, "cache")
+        self.fname = os.path.join(self.dir, "103_4320.txt")
+        with open(self.fname, 'w') as f:
+            print("M,12:05 301     Ojalvo    14:00", file=f)
+
+    def tearDown(self):
+        for f in os.listdir(self.dir):
+            os.unlink(os.path.join(self.dir, f))
+        os.rmdir(self.dir)
+
+    def testHitAfterSave(self):
+        c = ParseCache(self.cachefile)
+        k, d = parse_file(self.fname, c)
+        self.assertEqual((c.hits, c.misses), (0, 1))
+        c.save()
+        c = ParseCache(self.cachefile)
+        self.assertEqual(parse_file(self.fname, c), (k, d))
+        self.assertEqual((c.hits, c.misses), (1, 0))
+
+    def testChangedFile(self):
+        c = ParseCache(self.cachefile)
+        parse_file(self.fname, c)
+        with open(self.fname, 'a') as f:
+            print("T,7:45  305     Carmody    9:40", file=f)
+        k, d = parse_file(self.fname, c)
+        self.assertEqual(len(d), 2)
+        self.assertEqual(c.misses, 2)
+
+    def testTouchedFile(self):
+        c = ParseCache(self.cachefile)
+        parse_file(self.fname, c)
+        st = os.stat(self.fname)
+        os.utime(self.fname, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        parse_file(self.fname, c)
+        self.assertEqual((c.hits, c.misses), (1, 1))
+
+    def testInvalidateAndCap(self):
+        c = ParseCache(self.cachefile, max_entries=1)
+        parse_file(self.fname, c)
+        c.invalidate(self.fname)
+        self.assertEqual(len(c.entries), 0)
+        other = os.path.join(self.dir, "104_4320.txt")
+        with open(other, 'w') as f:
+            print("F,8:00 C 15:00", file=f)
+        parse_file(self.fname, c)
+        parse_file(other, c)
+        self.assertEqual(list(c.entries), [os.path.abspath(other)])
+
+    def testCorruptCacheFile(self):
+        with open(self.cachefile, 'w') as f:
+            f.write("garbage")
+        c = ParseCache(self.cachefile)
+        self.assertEqual(c.entries, {})
+
+
+class TestMerged(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.fname = os.path.join(self.dir, "all.sched")
+        with open(self.fname, 'w') as f:
+            print("# every room", file=f)
+            print("[103 4320]", file=f)
+            print("M,12:05 301      Ojalvo    14:00", file=f)
+            print("T,14:25 (321)301 Dhorkah   17:25", file=f)
+            print("", file=f)
+            print("[104_2223]", file=f)
+            print("F,8:00  C                  15:00", file=f)
+
+    def tearDown(self):
+        for f in os.listdir(self.dir):
+            os.unlink(os.path.join(self.dir, f))
+        os.rmdir(self.dir)
+
+    def testParseMerged(self):
+        data = parse_merged(self.fname)
+        self.assertEqual(list(data), [(103, 4320), (104, 2223)])
+        self.assertEqual(data[(103, 4320)][1],
+                         Section('T', (14, 25), '(321) 301', 'Dhorkah', (17, 25)))
+        self.assertEqual(data[(103, 4320)][1].lineno, 4)
+        self.assertEqual(data[(104, 2223)][0].lineno, 7)
+        self.assertEqual(parse_all(merged=self.fname), data)
+
+    def testParseRoom(self):
+        key, d = parse_room(self.fname, (104, 2223))
+        self.assertEqual(d, [Section('F', (8, 0), 'C', '', (15, 0))])
+        self.assertEqual(d[0].lineno, 7)
+        self.assertTrue(os.path.exists(self.fname + ".idx"))
+        self.assertEqual(parse_room(self.fname, (103, 4320)),
+                         ((103, 4320), parse_merged(self.fname)[(103, 4320)]))
+        self.assertRaises(KeyError, parse_room, self.fname, (1, 1))
+
+    def testStaleIndex(self):
+        room_index(self.fname)
+        self.assertNotEqual(load_index(self.fname), None)
+        with open(self.fname, 'a') as f:
+            print("M,7:45  302      Zeng      9:40", file=f)
+        self.assertEqual(load_index(self.fname), None)
+        key, d = parse_room(self.fname, (104, 2223))
+        self.assertEqual(len(d), 2)
+
+    def testIndexNotWritable(self):
+        # where the index can't be written, rooms are still read (a
+        # directory in the way of the index fails even for root)
+        tmp = self.fname + ".idx.tmp"
+        os.mkdir(tmp)
+        try:
+            key, d = parse_room(self.fname, (104, 2223))
+            self.assertEqual(len(d), 1)
+            self.assertFalse(os.path.exists(self.fname + ".idx"))
+            self.assertEqual(room_index(self.fname), scan_index(self.fname))
+        finally:
+            os.rmdir(tmp)
+
+    def testBadInput(self):
+        with open(self.fname, 'a') as f:
+            print("[103 4320]", file=f)
+        self.assertRaises(ValueError, parse_merged, self.fname)
+        with open(self.fname, 'w') as f:
+            print("M,12:05 301      Ojalvo    14:00", file=f)
+        self.assertRaises(ValueError, parse_merged, self.fname)
+
+    def testRoundTrip(self):
+        data = parse_merged(self.fname)
+        self.assertEqual(format_section(data[(103, 4320)][1]),
+                         "T,14:25 (321)301  Dhorkah    17:25")
+        out = os.path.join(self.dir, "copy.sched")
+        write_merged(data, out)
+        self.assertEqual(parse_merged(out), data)
+
+    def testCache(self):
+        c = ParseCache(os.path.join(self.dir, "cache"))
+        data = parse_merged(self.fname, c)
+        self.assertEqual(parse_merged(self.fname, c), data)
+        self.assertEqual((c.hits, c.misses), (1, 1))
+
 
 class TestUtil(unittest.TestCase):
     def setUp(self):
@@ -332,6 +722,19 @@ class TestUtil(unittest.TestCase):
     def testInvalidDay(self):
         self.assertRaises(ValueError, Section, "X", (14,0), "301", "Foo", (16,0))
 
+    def testSlots(self):
+        for obj in (Point(0,0), Rectangle(Point(0,0), Point(1,1)),
+                    HLine(Point(0,0), 5), Text(Point(0,0), "x"),
+                    Section('M', (14, 0), '301', 'Foo', (16, 0))):
+            self.assertFalse(hasattr(obj, "__dict__"))
+
+    def testSectionPickle(self):
+        import pickle
+        s = Section('M', (14, 0), '301', 'Foo', (16, 0), 7)
+        s2 = pickle.loads(pickle.dumps(s))
+        self.assertEqual(s2, s)
+        self.assertEqual(s2.lineno, 7)
+
     def testSectionDisplay(self):
         self.assertEqual("Section('M', (14, 0), '301', 'Foo', (16, 0))",
                          "%s" % Section('M', (14, 0), '301', 'Foo', (16, 0)))
@@ -386,15 +789,472 @@ class TestUtil(unittest.TestCase):
         self.assertTrue(t.contained_in(self.s.get_canvas()))
         self.assertEqual(0, timeslot(s2, self.s).height)
 
+    def testPeriodTable(self):
+        self.assertEqual(default_periods.timespan, 915)
+        self.assertEqual(list(default_periods), start_times)
+        evening = PeriodTable([(18,5), (17,0), (19,10)])
+        self.assertEqual(evening.times, [(17,0), (18,5), (19,10)])
+        self.assertEqual(evening.timespan, 130)
+        self.assertEqual(evening.index((16,0)), -1)
+        self.assertEqual(evening.index((18,5)), 1)
+        self.assertEqual(evening.snap((18,30)), (18,5))
+        self.assertEqual(evening.snap((6,0)), (17,0))
+        self.assertRaises(ValueError, PeriodTable, [(17,0)])
+        self.assertRaises(ValueError, PeriodTable, [(8,0), (8,0)])
+        self.assertRaises(ValueError, PeriodTable, [(8,0), (9,0), (8,0)])
+
+    def testPeriodTableFromFile(self):
+        fd, name = tempfile.mkstemp()
+        with os.fdopen(fd, 'w') as f:
+            print("# evenings\n17:00\n18:05  # second\n\n19:10", file=f)
+        try:
+            self.assertEqual(PeriodTable.from_file(name),
+                             PeriodTable([(17,0), (18,5), (19,10)]))
+        finally:
+            os.unlink(name)
+
+    def testPeriodTableFromBadFile(self):
+        fd, name = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            for text, where in (("17:00\n8.00\n", "line 2:"),
+                                ("8:00:00\n", "line 1:"),
+                                ("8:00\n8:00\n", "twice")):
+                with open(name, 'w') as f:
+                    f.write(text)
+                with self.assertRaises(ValueError) as e:
+                    PeriodTable.from_file(name)
+                self.assertIn(name, str(e.exception))
+                self.assertIn(where, str(e.exception))
+        finally:
+            os.unlink(name)
+
+    def testLayoutPeriods(self):
+        evening = PeriodTable([(17,0), (19,0)])
+        l = GridLayout(self.s.get_canvas(), evening)
+        bg = self.s.get_canvas()
+        self.assertEqual(l.y_time((17,0)), bg.max_y)
+        self.assertEqual(l.y_time((19,0)), bg.min_y)
+        self.assertEqual(l.y_time((18,0)), bg.center_y)
+
+    def testLayoutCached(self):
+        l = layout_of(self.s)
+        self.assertIs(layout_of(self.s), l)
+        self.assertIs(layout_of(l), l)
+        self.assertEqual(l.x_time("M"), x_time("M", self.s))
+        self.s.add(self.r3, True) # new canvas, new layout
+        self.assertIsNot(layout_of(self.s), l)
+        self.assertIs(layout_of(self.s).canvas, self.r3)
+
+    def testTimeslots(self):
+        sects = [Section(d, (7 + i, 45), "301", "Foo", (9 + i, 40))
+                 for i, d in enumerate("MTWRF")]
+        got = timeslots(sects, self.s)
+        want = [timeslot(sect, self.s) for sect in sects]
+        self.assertEqual([(r.origin, r.extent) for r in got],
+                         [(r.origin, r.extent) for r in want])
+
+class TestSVG(unittest.TestCase):
+    def setUp(self):
+        self.sections = [Section('M', (12, 5), '301', 'Ojalvo', (14, 0)),
+                         Section('T', (14, 25), '(321) 301', 'Dhorkah', (17, 25)),
+                         Section('F', (8, 0), 'C', '', (15, 0))]
+
+    def testMultiLineOnce(self):
+        f = io.StringIO()
+        lines = Text(Point(0,0), ["Multi", "Line", "Text"]).render_svg(f)
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(f.getvalue().count("<text"), 3)
+
+    def testSchedulePeriods(self):
+        evening = PeriodTable([(17,0), (18,5), (19,10), (20,15)])
+        f = io.StringIO()
+        scheduler.schedule_svg("Evening", [], f, periods=evening)
+        self.assertEqual(f.getvalue().count("<line"), 3)
+        f = io.StringIO()
+        scheduler.schedule("Evening", [Section('M', (18,5), '301', 'Foo', (20,0))],
+                           f, periods=evening)
+        self.assertEqual(len(re.findall(" [BF]\n", f.getvalue())), 1 + 5 + 3 + 1)
+
+    def testScheduleElementCounts(self):
+        f = io.StringIO()
+        scheduler.schedule_svg("Physics 103 | 4320", self.sections, f)
+        doc = f.getvalue()
+        # title, 5 days, 12 times and 3 lines per section
+        self.assertEqual(doc.count("<text"), 1 + 5 + 12 + 3 * 3)
+        # background, 5 days and the sections
+        self.assertEqual(doc.count("<rect"), 1 + 5 + 3)
+        self.assertEqual(doc.count("<line"), 12)
+        self.assertEqual(doc.count("<svg"), 1)
+        self.assertEqual(doc.count("</svg>"), 1)
+
+    def testFlipped(self):
+        # laid out with y upwards, drawn with y downwards from the top
+        s = Scene(Rectangle(Point(0,0), Point(100,50)))
+        s.add(Rectangle(Point(10,5), Point(20,15)).label_above("a", 10))
+        s.add(HLine(Point(0,40), 100))
+        doc = s.to_svg_bytes().decode("utf8")
+        self.assertIn('<rect x="10.000000" y="35.000000" height="10.000000" '
+                      'width="10.000000"', doc)
+        self.assertIn('<text x="15.000000" y="30.000000"', doc)
+        self.assertIn('y1="10.000000"', doc)
+        # the PostScript is the same layout, untouched
+        self.assertIn("\n10 5 10 10 B\n", s.to_ps_bytes().decode("utf8"))
+
+    def testFontSizes(self):
+        # the same text size as PostScript, in the units of the layout
+        s = Scene(Rectangle(Point(0,0), Point(100,50)))
+        s.add(Text(Point(10,10), "a", size=9.5))
+        s.add(Text(Point(10,30), "b", size=6))
+        svg = s.to_svg_bytes().decode("utf8")
+        ps = s.to_ps_bytes().decode("utf8")
+        self.assertEqual(re.findall(r"font-size: ([\d.]+)px;", svg),
+                         ["9.5", "6"])
+        self.assertEqual(
+            re.findall(r"/Helvetica findfont ([\d.]+) scalefont", ps),
+            ["9.5", "6"])
+
+    def testSameLayout(self):
+        # the same scene, hence the same placard, in both formats
+        ps = io.StringIO()
+        scheduler.schedule("Physics 103 | 4320", self.sections, ps)
+        svg = io.StringIO()
+        scheduler.schedule_svg("Physics 103 | 4320", self.sections, svg)
+        # (PostScript lines are flat boxes)
+        self.assertEqual(len(re.findall(r" [BF]\n", ps.getvalue())),
+                         svg.getvalue().count("<rect") +
+                         svg.getvalue().count("<line"))
+        self.assertEqual(len(re.findall(r"\) [CL]\n", ps.getvalue())),
+                         svg.getvalue().count("<text"))
+
+
+class TestCheck(unittest.TestCase):
+    def setUp(self):
+        self.a = Section('M', (12, 5), '301', 'Ojalvo', (14, 0))
+        self.b = Section('M', (13, 0), '302', 'Zeng', (15, 0))
+        self.c = Section('M', (14, 0), '303', 'Carmody', (16, 0))
+        self.d = Section('T', (13, 0), '304', 'Zeng', (15, 0))
+
+    def testOverlapping(self):
+        iv = [(0, 10, "a"), (20, 30, "d"), (5, 15, "b"), (10, 20, "c"),
+              (1, 2, "e")]
+        self.assertEqual(sorted(overlapping(iv)),
+                         [("a", "b"), ("a", "e"), ("b", "c")])
+        self.assertEqual(list(overlapping([])), [])
+
+    def testFindConflicts(self):
+        data = {(103, 4320): [self.a, self.c, self.d],
+                (104, 4320): [self.b],
+                (104, 4310): [self.b]}
+        self.assertEqual(find_conflicts(data),
+                         [Conflict((103, 4320), self.a, (104, 4320), self.b),
+                          Conflict((104, 4320), self.b, (103, 4320), self.c)])
+        self.assertEqual(str(find_conflicts(data)[0]),
+                         "103_4320 M 12:05-2:00 301 overlaps "
+                         "104_4320 M 1:00-3:00 302")
+
+    def testTAConflicts(self):
+        consult = Section('M', (12, 0), 'C', '', (16, 0))
+        data = {(103, 4320): [self.a, self.d, consult],
+                (104, 4310): [self.b, Section('M', (14, 0), '305', 'N/A', (16, 0))],
+                (104, 4320): [Section('M', (12, 0), '306', 'Ojalvo', (13, 0)),
+                              consult]}
+        self.assertEqual(find_ta_conflicts(data),
+                         [Conflict((104, 4320), data[(104, 4320)][0],
+                                   (103, 4320), self.a)])
+
+    def testTAIndex(self):
+        data = {(103, 4320): [self.b, self.d],
+                (104, 4310): [Section('M', (8, 0), '301', 'Zeng', (9, 0)),
+                              Section('M', (9, 0), '302', 'Zeng', (17, 0))]}
+        index = TAIndex(data)
+        self.assertEqual(index.tas(), ["Zeng"])
+        self.assertEqual([s.num for k, s in index.sections("Zeng", "M")],
+                         ["301", "302", "302"])
+        busy = index.busy("Zeng", "M", (12, 0), (13, 30))
+        self.assertEqual([(k, s.num) for k, s in busy],
+                         [((104, 4310), "302"), ((103, 4320), "302")])
+        self.assertEqual(index.busy("Zeng", "M", (7, 0), (8, 0)), [])
+        self.assertEqual(len(index.busy("Zeng", "M", (8, 30), (9, 30))), 2)
+        self.assertEqual(index.busy("Nobody", "M", (7, 0), (8, 0)), [])
+        self.assertEqual(len(index.conflicts()), 1)
+
+    def testTAConflictsMixedCase(self):
+        zeng = Section('M', (13, 0), '302', 'Zeng', (15, 0))
+        other = Section('M', (14, 0), '401', ' zeng', (16, 0))
+        data = {(103, 1): [zeng], (104, 2): [other]}
+        self.assertEqual(find_ta_conflicts(data),
+                         [Conflict((103, 1), zeng, (104, 2), other)])
+        index = TAIndex(data)
+        self.assertEqual(index.tas(), ["Zeng"])
+        self.assertEqual(len(index.busy("ZENG", "M", (14, 30), (14, 45))), 2)
+        self.assertEqual(len(ScheduleIndex(data).by_ta("Zeng")), 2)
+
+    def testNoConflicts(self):
+        self.assertEqual(find_conflicts({(103, 4320): [self.a, self.c, self.d]}),
+                         [])
+
+    def testFindOutside(self):
+        evening = PeriodTable([(17, 0), (18, 5), (19, 10)])
+        late = Section('M', (16, 30), '305', 'Foo', (17, 30))
+        night = Section('T', (18, 0), '306', 'Bar', (19, 0))
+        data = {(103, 4320): [self.a, night, late]}
+        found = find_outside(data, evening)
+        self.assertEqual(found, [Outside((103, 4320), self.a, evening),
+                                 Outside((103, 4320), late, evening)])
+        self.assertEqual(str(found[0]),
+                         "103_4320 M 12:05-2:00 301 is outside 5:00-7:10")
+        self.assertEqual(str(found[1]),
+                         "103_4320 M 4:30-5:30 305 runs past 5:00-7:10")
+        self.assertEqual(find_outside(data), [])
+
+
+class TestQuery(unittest.TestCase):
+    def setUp(self):
+        self.a = Section('M', (12, 5), '301', 'Ojalvo', (14, 0))
+        self.b = Section('T', (14, 25), '(321) 301', 'Dhorkah', (17, 25))
+        self.c = Section('T', (7, 45), '305', 'Ojalvo', (9, 40))
+        self.d = Section('M', (14, 25), '302', 'Zeng', (16, 20))
+        self.data = {(103, 4320): [self.a, self.c],
+                     (321, 2223): [self.b],
+                     (104, 4320): [self.d],
+                     (104, 4310): []}
+        self.index = ScheduleIndex(self.data)
+
+    def testSectionNumber(self):
+        self.assertEqual(section_number("(321)301"), "(321) 301")
+        self.assertEqual(section_number(" ( 321 ) 301 "), "(321) 301")
+        self.assertEqual(section_number(301), "301")
+
+    def testByTA(self):
+        self.assertEqual(self.index.by_ta("ojalvo"),
+                         [((103, 4320), self.a), ((103, 4320), self.c)])
+        self.assertEqual(self.index.by_ta("Nobody"), [])
+
+    def testBySection(self):
+        self.assertEqual(self.index.by_section("(321)301"),
+                         [((321, 2223), self.b)])
+        self.assertEqual(self.index.by_section("301"),
+                         [((103, 4320), self.a), ((321, 2223), self.b)])
+
+    def testByDay(self):
+        self.assertEqual(self.index.by_day("T"),
+                         [((103, 4320), self.c), ((321, 2223), self.b)])
+        self.assertEqual(self.index.by_day("F"), [])
+
+    def testInRoom(self):
+        self.assertEqual(self.index.in_room(2223, "T", (14, 30)),
+                         [((321, 2223), self.b)])
+        self.assertEqual(self.index.in_room(4320, "M", (14, 0)), [])
+        self.assertEqual(self.index.in_room(4320, "M", (14, 25)),
+                         [((104, 4320), self.d)])
+        self.assertEqual(self.index.in_room(9999, "M", (14, 25)), [])
+
+    def testFreeRooms(self):
+        self.assertEqual(self.index.free_rooms("M", (13, 0), (15, 0)),
+                         [2223, 4310])
+        self.assertEqual(self.index.free_rooms("M", (14, 0), (14, 25)),
+                         [2223, 4310, 4320])
+
+    def testFreeSlotsComplement(self):
+        slots = FreeSlots(self.data)
+        self.assertEqual(slots.gaps(4320, "M"),
+                         [((7, 45), (12, 5)), ((14, 0), (14, 25)),
+                          ((16, 20), (23, 0))])
+        self.assertEqual(slots.gaps(4310, "F"), [((7, 45), (23, 0))])
+        self.assertEqual(slots.complement([(465, 500), (480, 1400)]), [])
+
+    def testFreeSlotsFind(self):
+        slots = FreeSlots(self.data)
+        self.assertEqual(slots.find("M", 110, (13, 0), (17, 0)),
+                         [(2223, ((13, 0), (17, 0))),
+                          (4310, ((13, 0), (17, 0)))])
+        self.assertEqual(slots.find("M", 25, (13, 0), (17, 0)),
+                         [(2223, ((13, 0), (17, 0))),
+                          (4310, ((13, 0), (17, 0))),
+                          (4320, ((14, 0), (14, 25)))])
+        self.assertEqual(slots.free_rooms("T", 115, (7, 45), (9, 40)),
+                         [2223, 4310])
+        self.assertEqual(slots.free_rooms("T", 120), [2223, 4310, 4320])
+
+    def testFreeSlotsPeriods(self):
+        evening = PeriodTable([(17, 0), (18, 5), (19, 10)])
+        slots = FreeSlots(self.data, evening)
+        self.assertEqual(slots.gaps(2223, "T"), [((17, 25), (19, 10))])
+        self.assertEqual(slots.free_rooms("T", 120), [4310, 4320])
+
+    def testFreeSlotsBadDay(self):
+        slots = FreeSlots(self.data)
+        self.assertRaises(ValueError, slots.find, "X", 60)
+        self.assertRaises(ValueError, slots.gaps, 4320, "X")
+
+    def testMainBadArguments(self):
+        # the usage line and status 2, not a traceback
+        bad = [[], ["slot", "X", "60"], ["slot", "M", "sixty"],
+               ["room", "x", "T", "14:30"], ["room", "4320", "T", "2pm"],
+               ["room", "4320", "TR", "14:30"], ["free", "M", "13:00", "15"],
+               ["free", "M", "13:00:00", "15:00"], ["day", "Sunday"],
+               ["ta"], ["nonsense", "x"]]
+        cwd, d = os.getcwd(), tempfile.mkdtemp()
+        stderr = sys.stderr
+        try:
+            os.chdir(d)
+            for args in bad:
+                err = sys.stderr = io.StringIO()
+                self.assertEqual(sched_query.main(args), 2, args)
+                self.assertTrue(err.getvalue().startswith("usage:"), args)
+        finally:
+            sys.stderr = stderr
+            os.chdir(cwd)
+            for f in os.listdir(d):
+                os.unlink(os.path.join(d, f))
+            os.rmdir(d)
+
+    def testIntervalList(self):
+        # the same answers as looking at every interval, in order of start
+        import random
+        rnd = random.Random(7)
+        iv = list()
+        for n in range(300):
+            start = rnd.randrange(0, 1000)
+            iv.append((start, start + rnd.choice((1, 5, 30, 1000)), n))
+        iv.append((0, 2000, "all day"))
+        ivl = IntervalList(iv)
+        ordered = sorted(iv, key=lambda i: i[:2])
+        for lo in range(0, 1100, 37):
+            hi = lo + rnd.randrange(1, 60)
+            self.assertEqual(ivl.overlapping(lo, hi),
+                             [p for s, e, p in ordered if s < hi and e > lo])
+            self.assertEqual(ivl.at(lo),
+                             [p for s, e, p in ordered if s <= lo < e])
+        self.assertEqual(IntervalList([]).overlapping(0, 10), [])
+
+
+class TestMain(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.dir = tempfile.mkdtemp()
+        os.chdir(self.dir)
+        for name, line in [("103_4320.txt", "M,12:05 301 Ojalvo 14:00"),
+                           ("104_4320.txt", "T,7:45 305 Carmody 9:40")]:
+            with open(name, 'w') as f:
+                print(line, file=f)
+
+    def tearDown(self):
+        for f in os.listdir(self.dir):
+            os.unlink(f)
+        os.chdir(self.cwd)
+        os.rmdir(self.dir)
+
+    def testFullBuild(self):
+        written = scheduler.main()
+        self.assertEqual(written, ["103_4320.ps", "104_4320.ps", "summary.ps"])
+        self.assertEqual(scheduler.main(), written) # not incremental
+
+    def testJobs(self):
+        serial = scheduler.main()
+        with open("103_4320.ps") as f:
+            expected = f.read()
+        os.unlink("103_4320.ps")
+        self.assertEqual(scheduler.main(jobs=2), serial)
+        with open("103_4320.ps") as f:
+            self.assertEqual(f.read(), expected)
+
+    def testMerged(self):
+        separate = scheduler.main()
+        with open("103_4320.ps") as f:
+            expected = f.read()
+        write_merged(parse_all(), "all.sched")
+        for name in os.listdir("."):
+            if name.endswith(".txt") or name.endswith(".ps"):
+                os.unlink(name)
+        self.assertEqual(scheduler.main(merged="all.sched"), separate)
+        with open("103_4320.ps") as f:
+            self.assertEqual(f.read(), expected)
+
+    def testCombined(self):
+        written = scheduler.main(combined_doc=True)
+        self.assertEqual(written, ["schedule.ps"])
+        self.assertFalse(os.path.exists("103_4320.ps"))
+        with open("schedule.ps") as f:
+            ps = f.read()
+        # both placards on one page, then the summary
+        self.assertEqual(ps.count("%%Page: "), 2)
+        self.assertIn("\n%%Pages: 2\n", ps)
+        self.assertIn("\ngsave 0 450 translate\n", ps)
+        self.assertIn("\ngsave 0 54 translate\n", ps)
+        self.assertIn("(Physics 104 | 4320) C", ps)
+        self.assertEqual(scheduler.main(incremental=True, combined_doc=True),
+                         [])
+
+    def testPDF(self):
+        written = scheduler.main(format="PDF")
+        self.assertEqual(written, ["schedule.pdf"])
+        with open("schedule.pdf", "rb") as f:
+            pdf = f.read()
+        self.assertTrue(pdf.startswith(b"%PDF-1.5"))
+        # one grid for the placards, one for the summary's small ones
+        self.assertEqual(pdf.count(b"/Subtype /Form"), 2)
+        self.assertEqual(scheduler.main(format="PDF", incremental=True), [])
+
+    def testBothFormats(self):
+        written = scheduler.main(format=("PS", "SVG"), incremental=True)
+        self.assertEqual(written, ["103_4320.ps", "103_4320.svg",
+                                   "104_4320.ps", "104_4320.svg",
+                                   "summary.ps", "summary.svg"])
+        with open("summary.svg") as f:
+            self.assertIn("Physics 104 | 4320", f.read())
+        os.unlink("104_4320.svg")
+        self.assertEqual(scheduler.main(format=("PS", "SVG"),
+                                        incremental=True), ["104_4320.svg"])
+
+    def testOutsidePeriods(self):
+        # daytime labs on an evening table: reported and left off, no crash
+        evening = PeriodTable([(17, 0), (18, 5), (19, 10)])
+        with open("104_4320.txt", 'a') as f:
+            print("W,16:35 306 Zeng 18:30", file=f)
+        err = io.StringIO()
+        stderr, sys.stderr = sys.stderr, err
+        try:
+            written = scheduler.main(periods=evening)
+        finally:
+            sys.stderr = stderr
+        self.assertEqual(written, ["103_4320.ps", "104_4320.ps", "summary.ps"])
+        self.assertIn("Sections outside the periods (3):", err.getvalue())
+        self.assertIn("104_4320 W 4:35-6:30 306 runs past 5:00-7:10",
+                      err.getvalue())
+        with open("104_4320.ps") as f:
+            ps = f.read()
+        self.assertIn("(306) L", ps)
+        self.assertNotIn("(305) L", ps)
+
+    def testIncremental(self):
+        scheduler.main(incremental=True)
+        self.assertEqual(scheduler.main(incremental=True), [])
+        with open("104_4320.txt", 'a') as f:
+            print("T,9:55 306 Zeng 11:50", file=f)
+        self.assertEqual(scheduler.main(incremental=True),
+                         ["104_4320.ps", "summary.ps"])
+        os.unlink("103_4320.ps")
+        self.assertEqual(scheduler.main(incremental=True), ["103_4320.ps"])
+
+
 def suite():
     suite = unittest.TestSuite()
     suite.addTest(unittest.makeSuite(TestPoint))
     suite.addTest(unittest.makeSuite(TestScene))
     suite.addTest(unittest.makeSuite(TestRectangle))
     suite.addTest(unittest.makeSuite(TestHLine))
+    suite.addTest(unittest.makeSuite(TestRectBatch))
     suite.addTest(unittest.makeSuite(TestText))
     suite.addTest(unittest.makeSuite(TestParser))
+    suite.addTest(unittest.makeSuite(TestParseCache))
+    suite.addTest(unittest.makeSuite(TestMerged))
     suite.addTest(unittest.makeSuite(TestUtil))
+    suite.addTest(unittest.makeSuite(TestSVG))
+    suite.addTest(unittest.makeSuite(TestCheck))
+    suite.addTest(unittest.makeSuite(TestQuery))
+    suite.addTest(unittest.makeSuite(TestMain))
     return suite
 
 if __name__ == "__main__": # pragma: no cover